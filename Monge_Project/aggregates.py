@@ -0,0 +1,178 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Range aggregates answered by CountryAggregates.frame()
+AGGREGATIONS = ["mean", "latest", "cagr"]
+
+
+# Per-country running sums and counts of every metric, kept per year so any
+# year range is answered from prefix sums (one pass over the countries, no
+# scan of the panel). Rows appended later are folded into the same tables
+class CountryAggregates:
+    def __init__(self, df=None, metrics=None):
+        if metrics is None:
+            metrics = [] if df is None else [c for c in df.select_dtypes("number").columns if c != "Year"]
+        self.metrics = list(metrics)
+        self.years = []
+        self.countries = []
+        self._year_pos = {}
+        self._country_pos = {}
+        self._sums = np.zeros((0, 0, len(self.metrics)))
+        self._counts = np.zeros((0, 0, len(self.metrics)), dtype=np.int64)
+        self._prefix = None
+        self._lock = threading.Lock()
+        if df is not None:
+            self.append(df)
+
+    # New years / countries grow the tables; both stay sorted, so the order
+    # of the results does not depend on the order of the panel rows
+    def _grow(self, years, countries):
+        new_years = sorted(set(years) - set(self._year_pos))
+        new_countries = [c for c in dict.fromkeys(countries) if c not in self._country_pos]
+        if not new_years and not new_countries:
+            return
+
+        all_years = sorted(self.years + new_years)
+        all_countries = sorted(self.countries + new_countries)
+        shape = (len(all_years), len(all_countries), len(self.metrics))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        if self.years:
+            rows = [all_years.index(y) for y in self.years]
+            position = {c: i for i, c in enumerate(all_countries)}
+            cols = [position[c] for c in self.countries]
+            sums[np.ix_(rows, cols)] = self._sums
+            counts[np.ix_(rows, cols)] = self._counts
+
+        self.years = all_years
+        self.countries = all_countries
+        self._year_pos = {y: i for i, y in enumerate(all_years)}
+        self._country_pos = {c: i for i, c in enumerate(all_countries)}
+        self._sums = sums
+        self._counts = counts
+
+    def append(self, rows):
+        years = rows["Year"].astype(int).tolist()
+        countries = rows["Country"].astype(str).tolist()
+        values = rows[self.metrics].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+
+        with self._lock:
+            self._grow(years, countries)
+            y = np.array([self._year_pos[v] for v in years], dtype=np.intp)
+            c = np.array([self._country_pos[v] for v in countries], dtype=np.intp)
+            np.add.at(self._sums, (y, c), np.where(present, values, 0.0))
+            np.add.at(self._counts, (y, c), present)
+            self._prefix = None
+
+    # Cumulative sums over the years, with a leading row of zeros, and for
+    # every year the position of the last year up to it / the first year from
+    # it with a value (-1 / len(years) when there is none)
+    def _prefix_tables(self):
+        if self._prefix is None:
+            pad = ((1, 0), (0, 0), (0, 0))
+            positions = np.arange(len(self.years))[:, np.newaxis, np.newaxis]
+            seen = self._counts > 0
+            last_seen = np.maximum.accumulate(np.where(seen, positions, -1), axis=0)
+            first_seen = np.minimum.accumulate(np.where(seen, positions, len(self.years))[::-1], axis=0)[::-1]
+            self._prefix = (np.pad(self._sums.cumsum(axis=0), pad),
+                            np.pad(self._counts.cumsum(axis=0), pad),
+                            last_seen, first_seen)
+        return self._prefix
+
+    # Positions [lo, hi) of the years between `start` and `end`
+    def _span(self, start, end):
+        lo = 0 if start is None else int(np.searchsorted(self.years, start, side="left"))
+        hi = len(self.years) if end is None else int(np.searchsorted(self.years, end, side="right"))
+        return lo, hi
+
+    # Value of every country in the year at position `pos` (a country x metric
+    # array of positions, out of range = no value)
+    def _value_at(self, pos, cols):
+        valid = (pos >= 0) & (pos < len(self.years))
+        safe = np.where(valid, pos, 0)
+        countries = np.arange(len(self.countries))[:, np.newaxis]
+        sums = self._sums[safe, countries, cols]
+        counts = self._counts[safe, countries, cols]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(valid & (counts > 0), sums / counts, np.nan)
+
+    # Mean per country of `metrics` between the years `start` and `end`
+    # (both included, None = open end) as a DataFrame country x metric
+    def means(self, metrics=None, start=None, end=None):
+        metrics = self.metrics if metrics is None else list(metrics)
+        with self._lock:
+            sums, counts = self._prefix_tables()[:2]
+            lo, hi = self._span(start, end)
+            cols = [self.metrics.index(m) for m in metrics]
+            total = sums[hi, :, cols] - sums[lo, :, cols]
+            count = counts[hi, :, cols] - counts[lo, :, cols]
+            countries = list(self.countries)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        # fancy indexing over the metrics puts them first
+        return pd.DataFrame(mean.T, index=pd.Index(countries, name="Country"), columns=metrics)
+
+    # Last value per country between `start` and `end` (latest year with data)
+    def latest(self, metrics=None, start=None, end=None):
+        metrics = self.metrics if metrics is None else list(metrics)
+        with self._lock:
+            last_seen = self._prefix_tables()[2]
+            lo, hi = self._span(start, end)
+            cols = [self.metrics.index(m) for m in metrics]
+            if hi > lo:
+                pos = last_seen[hi - 1][:, cols]
+                values = self._value_at(np.where(pos >= lo, pos, -1), cols)
+            else:
+                values = np.full((len(self.countries), len(cols)), np.nan)
+            countries = list(self.countries)
+        return pd.DataFrame(values, index=pd.Index(countries, name="Country"), columns=metrics)
+
+    # Compound annual growth (% per year) between the first and the last year
+    # with data in the range; NaN with fewer than two years or non-positive values
+    def growth(self, metrics=None, start=None, end=None):
+        metrics = self.metrics if metrics is None else list(metrics)
+        with self._lock:
+            _, _, last_seen, first_seen = self._prefix_tables()
+            lo, hi = self._span(start, end)
+            cols = [self.metrics.index(m) for m in metrics]
+            shape = (len(self.countries), len(cols))
+            if hi > lo:
+                last = last_seen[hi - 1][:, cols]
+                first = first_seen[lo][:, cols]
+                last = np.where(last >= lo, last, -1)
+                first = np.where(first < hi, first, len(self.years))
+                last_value = self._value_at(last, cols)
+                first_value = self._value_at(first, cols)
+                # posiciones fuera de rango no cuentan (el valor ya es NaN)
+                years = np.asarray(self.years, dtype=float)
+                elapsed = years[np.maximum(last, 0)] - years[np.minimum(first, len(self.years) - 1)]
+            else:
+                last_value = first_value = elapsed = np.full(shape, np.nan)
+            countries = list(self.countries)
+
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            ok = (elapsed > 0) & (first_value > 0) & (last_value > 0)
+            rate = np.where(ok, (last_value / first_value) ** (1 / np.where(ok, elapsed, 1)) - 1, np.nan)
+        return pd.DataFrame(rate * 100, index=pd.Index(countries, name="Country"), columns=metrics)
+
+    # One row per country with the `method` aggregate (AGGREGATIONS) of every
+    # metric between `start` and `end`, shaped like a year slice of the panel
+    def frame(self, method="mean", start=None, end=None, metrics=None):
+        table = {"mean": self.means, "latest": self.latest, "cagr": self.growth}[method](metrics, start, end)
+        return table.reset_index()
+
+    # The k countries with the highest mean; a list of metrics is ranked by
+    # the average of their means (e.g. female and male employment)
+    def top(self, metric, k=1, start=None, end=None):
+        metrics = [metric] if isinstance(metric, str) else list(metric)
+        table = self.means(metrics, start, end)
+        values = table.mean(axis=1).to_numpy() if len(metrics) > 1 else table[metrics[0]].to_numpy()
+
+        valid = np.flatnonzero(~np.isnan(values))
+        # empates: gana el país que va antes en el índice (orden alfabético)
+        order = valid[np.lexsort((valid, -values[valid]))][:k]
+        return [(table.index[i], float(values[i])) for i in order]
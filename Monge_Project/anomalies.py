@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from schema import restore
+
+METRICS = ["Expenditure", "BachelorRate", "MasterRate", "EmploymentRate_Females", "EmploymentRate_Males"]
+
+BELOW = "Below normal range (Q1 - 1.5×IQR)"
+ABOVE = "Above normal range (Q3 + 1.5×IQR)"
+
+
+# Q1/Q3 for every metric at once, either over the whole panel or per group
+# (per year / per country) using pandas' grouped quantile, no Python loop
+def iqr_bounds(df, metrics, group=None):
+    values = df[metrics]
+    if group is None:
+        q1 = values.quantile(0.25).to_numpy()[np.newaxis, :]
+        q3 = values.quantile(0.75).to_numpy()[np.newaxis, :]
+    else:
+        grouped = values.groupby(df[group])
+        q1 = grouped.transform("quantile", 0.25).to_numpy(dtype=float)
+        q3 = grouped.transform("quantile", 0.75).to_numpy(dtype=float)
+
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+# Label every row of every metric in one vectorized pass. Returns a dict
+# metric -> frame (Year, Country, metric, Explanation, Status) without the
+# rows where that metric is missing
+def label_anomalies(df, metrics=METRICS, group=None):
+    lower, upper = iqr_bounds(df, metrics, group)
+    values = df[metrics].to_numpy(dtype=float)
+
+    # -1 normal, 0 below, 1 above (NaN compares False, so it stays normal)
+    codes = np.select([values < lower, values > upper], [0, 1], default=-1)
+    years = df["Year"].to_numpy()
+    countries = df["Country"].to_numpy()
+
+    results = {}
+    for j, metric in enumerate(metrics):
+        present = ~np.isnan(values[:, j])
+        metric_codes = codes[present, j]
+        results[metric] = pd.DataFrame({
+            "Year": years[present],
+            "Country": countries[present],
+            metric: restore(df[metric].to_numpy()[present]),
+            "Explanation": pd.Categorical.from_codes(metric_codes, categories=[BELOW, ABOVE]),
+            "Status": np.where(metric_codes >= 0, "Anomaly", "Normal"),
+        })
+    return results
+
+
+# Labelled frames cached per dataset version and grouping; entries of older
+# versions are dropped the first time a new version is requested
+class AnomalyEngine:
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._results = {}
+        self._outliers = {}
+        self._lock = threading.Lock()
+
+    def detect(self, df, version, group=None):
+        key = (version, group)
+        with self._lock:
+            result = self._results.get(key)
+        if result is not None:
+            return result
+
+        result = label_anomalies(df, self.metrics, group)
+        with self._lock:
+            self._results = {k: v for k, v in self._results.items() if k[0] == version}
+            self._results[key] = result
+        return result
+
+    # Only the anomalous rows of one metric (the anomaly table pages over this)
+    def outliers(self, df, version, metric, group=None):
+        key = (version, group, metric)
+        with self._lock:
+            frame = self._outliers.get(key)
+        if frame is not None:
+            return frame
+
+        labelled = self.detect(df, version, group)[metric]
+        frame = labelled.loc[labelled["Status"] == "Anomaly", ["Country", "Year", metric, "Explanation"]]
+        # por país y año, sea cual sea el orden de las filas del panel
+        frame = frame.sort_values(["Country", "Year"], kind="stable", ignore_index=True)
+        with self._lock:
+            self._outliers = {k: v for k, v in self._outliers.items() if k[0] == version}
+            self._outliers[key] = frame
+        return frame
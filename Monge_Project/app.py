@@ -1,31 +1,94 @@
+import os
+from functools import wraps
+from math import ceil
+from urllib.parse import parse_qs
 import pandas as pd
 import dash
-from dash import dcc, html, Input, Output, callback_context
+from dash import dcc, html, Input, Output, State, ClientsideFunction, callback_context
 from dash import dash_table
 import plotly.express as px
-
-# Load the dataset (adjusted path)
-df = pd.read_csv("education_analysis_dataset_clean.csv")
-
-#Efficiency 
-df["Efficiency_Graduation"] = df["BachelorRate"] / df["Expenditure"]
-df["Efficiency_Employment_Females"] = df["EmploymentRate_Females"] / df["Expenditure"]
-df["Efficiency_Employment_Males"] = df["EmploymentRate_Males"] / df["Expenditure"]
-
-# Convert wide format to long format for Employment by Sex
-df_long = pd.melt(
-    df,
-    id_vars=["Year", "Country", "BachelorRate", "MasterRate"],
-    value_vars=["EmploymentRate_Females", "EmploymentRate_Males"],
-    var_name="Sex",
-    value_name="EmploymentRate"
+from flask import abort, jsonify, request
+from figure_cache import BakedFigures, FigureCache, SingleFlight, cached_figure
+import background
+from aggregates import AGGREGATIONS
+from data_store import melt_employment
+from datasets import ReloadWatcher, default_registry
+from downsample import color_column, grid_sample, render_mode
+from rankings import bottom_rows, sort_frame, top_rows
+from table_query import query_page
+from metrics import CallbackMetrics, instrument, phase, timed
+from compression import enable_compression
+import serialization
+
+# Paneles disponibles; se cargan al primer uso y el principal al arrancar
+# (columnar store memory-mapped si existe, CSV si no)
+datasets = default_registry()
+datasets.get()
+
+# Recarga en caliente: los ficheros de los paneles cargados se revisan cada
+# DATA_RELOAD_INTERVAL segundos (0 la desactiva) y los que cambian se
+# reconstruyen en segundo plano
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", "30"))
+reload_watcher = None
+
+
+# Los hilos no sobreviven a un fork: con gunicorn (wsgi.py) cada worker
+# arranca el suyo después del fork (DATA_RELOAD_AFTER_FORK)
+def start_reload_watcher():
+    global reload_watcher
+    if DATA_RELOAD_INTERVAL > 0 and (reload_watcher is None or not reload_watcher.is_alive()):
+        reload_watcher = ReloadWatcher(datasets, DATA_RELOAD_INTERVAL)
+        reload_watcher.start()
+
+
+if not os.environ.get("DATA_RELOAD_AFTER_FORK"):
+    start_reload_watcher()
+
+# Caché de figuras (tamaño y TTL configurables por variables de entorno)
+figure_cache = FigureCache(
+    maxsize=int(os.environ.get("FIGURE_CACHE_SIZE", "256")),
+    ttl=float(os.environ["FIGURE_CACHE_TTL"]) if os.environ.get("FIGURE_CACHE_TTL") else None,
+    version=lambda: datasets.generation
 )
 
-# Renombrar valores para mejor visualización
-df_long["Sex"] = df_long["Sex"].replace({
-    "EmploymentRate_Females": "Female",
-    "EmploymentRate_Males": "Male"
-})
+# Figuras pre-renderizadas con bake_figures.py (se usan si existen)
+BAKED_FIGURES_DIR = os.environ.get("BAKED_FIGURES_DIR", "baked_figures")
+baked_figures = BakedFigures(BAKED_FIGURES_DIR, version=lambda: datasets.get().version)
+
+
+# Versión del panel que pide una llamada (el panel es siempre el último
+# argumento de los callbacks); no depende de qué otros paneles estén cargados
+def requested_version(args):
+    return datasets.get(args[-1]).version
+
+
+# Peticiones idénticas simultáneas (un enlace compartido a la vez por muchos
+# usuarios) comparten un solo cálculo: entre hilos siempre y entre los
+# workers de la máquina cuando SINGLE_FLIGHT_DIR está definido (wsgi.py)
+figure_flight = SingleFlight(os.environ.get("SINGLE_FLIGHT_DIR") or None,
+                             version=lambda key: requested_version(key[1]))
+
+# Callbacks pesados en segundo plano (background.py); los resultados se
+# comparten entre usuarios mientras no cambie la versión del panel pedido
+background_manager = background.manager(cache_by=[requested_version])
+
+# Agrupación de los límites IQR (cada panel tiene su motor de anomalías)
+anomaly_groups = {"all": None, "year": "Year", "country": "Country"}
+ANOMALY_PAGE_SIZE = 10
+# Países en las vistas Top / Bottom de la página de eficiencia
+EFFICIENCY_TOP_K = 10
+
+# Modos de año de las páginas: un solo año, un valor por país agregado
+# sobre un rango de años (AGGREGATIONS) o, en los gráficos de dispersión,
+# todas las filas del rango
+year_modes = {
+    "year": "Single year",
+    "mean": "Mean over range",
+    "latest": "Latest in range",
+    "cagr": "Growth (CAGR, % per year)",
+    "all": "All years in range",
+}
+assert set(year_modes) == {"year", "all", *AGGREGATIONS}
 
 
 # Initialize Dash app
@@ -38,9 +101,26 @@ color_palette = px.colors.sequential.YlOrBr + px.colors.sequential.Blues[::-1]
 # App layout with location routing
 app.layout = html.Div(style={"fontFamily": "Arial, sans-serif"}, children=[
     dcc.Location(id='url', refresh=False),
+    dcc.Store(id='active-dataset', storage_type='session'),
     html.Div(id='page-content')
     ])
 
+map_variables = ["Expenditure", "BachelorRate", "MasterRate", "EmploymentRate_Females", "EmploymentRate_Males"]
+
+
+# Paquete compacto que se envía una vez al navegador para animar el mapa
+def build_map_bundle(ds):
+    return {
+        "countries": ds.countries,
+        "values": {
+            variable: {
+                str(year): [None if pd.isna(v) else float(v) for v in row]
+                for year, row in zip(ds.years, ds.map_values(variable).to_numpy())
+            }
+            for variable in map_variables
+        }
+    }
+
 card_style = {
     "backgroundColor": "#ffffffdf",
     "boxShadow": "0 4px 8px rgba(0,0,0,0.1)",
@@ -55,146 +135,127 @@ card_style = {
     "userSelect": "none"
 }
 
-# Calcular KPIs para las tarjetas
-max_investment_country = df.groupby("Country")["Expenditure"].mean().idxmax()
-max_investment_value = df.groupby("Country")["Expenditure"].mean().max()
-
-# Promedio empleo por país (promedio de hombres y mujeres)
-employment_avg = df.groupby("Country")[["EmploymentRate_Females", "EmploymentRate_Males"]].mean()
-employment_avg["Average"] = employment_avg.mean(axis=1)
-max_employment_country = employment_avg["Average"].idxmax()
-max_employment_value = employment_avg["Average"].max()
-
-# Calcular eficiencia (graduación / gasto)
-df["Efficiency_Graduation"] = df["BachelorRate"] / df["Expenditure"]
-efficiency_avg = df.groupby("Country")["Efficiency_Graduation"].mean()
-max_efficiency_country = efficiency_avg.idxmax()
-max_efficiency_value = efficiency_avg.max()
-
-# Crear componente con las tarjetas KPI
-insight_cards = html.Div([
-    html.Div([
-        html.H3("Highest Investment"),
-        html.P(f"{max_investment_country}: €{max_investment_value:,.1f}M")
-    ], style=card_style),
-
-    html.Div([
-        html.H3("Highest Employment Rate (Avg)"),
-        html.P(f"{max_employment_country}: {max_employment_value:.1f}%")
-    ], style=card_style),
-
-    html.Div([
-        html.H3("Highest Efficiency (Graduation / Expenditure)"),
-        html.P(f"{max_efficiency_country}: {max_efficiency_value:.2f}")
-    ], style=card_style),
-], style={
-    "display": "flex",
-    "justifyContent": "space-around",
-    "margin": "40px auto",
-    "maxWidth": "900px",
-    "gap": "20px"
-})
+# Tarjetas KPI para un rango de años (medias por país del motor de agregados)
+def build_insight_cards(ds, start=None, end=None):
+    # País con el valor más alto (los paneles sin esa métrica no tienen dato)
+    def best(metric, fmt):
+        top = ds.aggregates.top(metric, 1, start, end)
+        if not top:
+            return "No data"
+        country, value = top[0]
+        return f"{country}: {fmt.format(value)}"
+
+    return [
+        html.Div([
+            html.H3("Highest Investment"),
+            html.P(best("Expenditure", "€{:,.1f}M"))
+        ], style=card_style),
 
+        # Promedio empleo por país (promedio de hombres y mujeres)
+        html.Div([
+            html.H3("Highest Employment Rate (Avg)"),
+            html.P(best(["EmploymentRate_Females", "EmploymentRate_Males"], "{:.1f}%"))
+        ], style=card_style),
 
-# Home Page Layout
-home_layout = html.Div([
-    html.Div([
-        html.H1("Education & Employment in Europe", style={
-            "textAlign": "center",
-            "fontSize": "48px",
-            "color": "black",
-            "paddingTop": "50px"
-            
-        }),
-        html.H2("Explore how investment in tertiary education impacts outcomes across Europe.", style={
-            "textAlign": "center",
-            "fontSize": "24px",
-            "color": "black"
+        # Eficiencia (graduación / gasto)
+        html.Div([
+            html.H3("Highest Efficiency (Graduation / Expenditure)"),
+            html.P(best("Efficiency_Graduation", "{:.2f}"))
+        ], style=card_style),
+    ]
+
+
+def build_home_layout(ds):
+    # Crear componente con las tarjetas KPI (todos los años al cargar)
+    insight_cards = html.Div([
+        html.Div(id="home-kpis", children=build_insight_cards(ds), style={
+            "display": "flex",
+            "justifyContent": "space-around",
+            "gap": "20px"
         }),
+        dcc.RangeSlider(
+            id="home-years",
+            min=int(ds.years[0]),
+            max=int(ds.years[-1]),
+            step=1,
+            value=[int(ds.years[0]), int(ds.years[-1])],
+            marks=ds.marks
+        )
+    ], style={
+        "margin": "40px auto",
+        "maxWidth": "900px"
+    })
 
-        insight_cards,
-
+    return html.Div([
         html.Div([
-            html.Div([
-                html.A(html.Button("Graduation vs. Expenditure", style={
-                    "backgroundColor": "#ffffffcc",
-                    "color": "#333",
-                    "fontSize": "18px",
-                    "padding": "15px 30px",
-                    "margin": "10px",
-                    "borderRadius": "12px",
-                    "border": "none",
-                    "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                    "cursor": "pointer",
-                    "fontWeight": "bold"
-                }), href="/hypothesis1"),
-
-                html.A(html.Button("Graduation vs. Employment", style={
-                    "backgroundColor": "#ffffffcc",
-                    "color": "#333",
-                    "fontSize": "18px",
-                    "padding": "15px 30px",
-                    "margin": "10px",
-                    "borderRadius": "12px",
-                    "border": "none",
-                    "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                    "cursor": "pointer",
-                    "fontWeight": "bold"
-                }), href="/hypothesis2"),
-
-                html.A(html.Button("Employment by Gender", style={
-                    "backgroundColor": "#ffffffcc",
-                    "color": "#333",
-                    "fontSize": "18px",
-                    "padding": "15px 30px",
-                    "margin": "10px",
-                    "borderRadius": "12px",
-                    "border": "none",
-                    "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                    "cursor": "pointer",
-                    "fontWeight": "bold"
-                }), href="/hypothesis3"),
-
-                html.A(html.Button("Efficiency Index", style={
-                "backgroundColor": "#ffffffcc",
-                "color": "#333",
-                "fontSize": "18px",
-                "padding": "15px 30px",
-                "margin": "10px",
-                "borderRadius": "12px",
-                "border": "none",
-                "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                "cursor": "pointer",
-                "fontWeight": "bold"
-                }), href="/efficiency"),
+            html.H1("Education & Employment in Europe", style={
+                "textAlign": "center",
+                "fontSize": "48px",
+                "color": "black",
+                "paddingTop": "50px"
+            
+            }),
+            html.H2("Explore how investment in tertiary education impacts outcomes across Europe.", style={
+                "textAlign": "center",
+                "fontSize": "24px",
+                "color": "black"
+            }),
 
-                html.A(html.Button("Interactive Map", style={
-                    "backgroundColor": "#ffffffcc",
-                    "color": "#333",
-                    "fontSize": "18px",
-                    "padding": "15px 30px",
-                    "margin": "10px",
-                    "borderRadius": "12px",
-                    "border": "none",
-                    "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                    "cursor": "pointer",
-                    "fontWeight": "bold"
-                }), href="/map"),
+            # Panel de datos que usan todas las páginas
+            html.Div([
+                dcc.Dropdown(
+                    id="dataset-select",
+                    options=datasets.options(),
+                    value=ds.name,
+                    clearable=False,
+                    style={"color": "#333"}
+                )
+            ], style={"maxWidth": "450px", "margin": "20px auto"}),
 
-                    html.A(html.Button("Custom Graph", style={
-                    "backgroundColor": "#ffffffcc",
-                    "color": "#333",
-                    "fontSize": "18px",
-                    "padding": "15px 30px",
-                    "margin": "10px",
-                    "borderRadius": "12px",
-                    "border": "none",
-                    "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
-                    "cursor": "pointer",
-                    "fontWeight": "bold"
-                }), href="/custom"),
+            insight_cards,
 
-                html.A(html.Button("Anomaly Detection", style={
+            html.Div([
+                html.Div([
+                    html.A(html.Button("Graduation vs. Expenditure", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/hypothesis1"),
+
+                    html.A(html.Button("Graduation vs. Employment", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/hypothesis2"),
+
+                    html.A(html.Button("Employment by Gender", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/hypothesis3"),
+
+                    html.A(html.Button("Efficiency Index", style={
                     "backgroundColor": "#ffffffcc",
                     "color": "#333",
                     "fontSize": "18px",
@@ -205,25 +266,64 @@ home_layout = html.Div([
                     "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
                     "cursor": "pointer",
                     "fontWeight": "bold"
-                }), href="/anomalies"),
+                    }), href="/efficiency"),
+
+                    html.A(html.Button("Interactive Map", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/map"),
+
+                        html.A(html.Button("Custom Graph", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/custom"),
+
+                    html.A(html.Button("Anomaly Detection", style={
+                        "backgroundColor": "#ffffffcc",
+                        "color": "#333",
+                        "fontSize": "18px",
+                        "padding": "15px 30px",
+                        "margin": "10px",
+                        "borderRadius": "12px",
+                        "border": "none",
+                        "boxShadow": "0px 4px 10px rgba(0, 0, 0, 0.2)",
+                        "cursor": "pointer",
+                        "fontWeight": "bold"
+                    }), href="/anomalies"),
+
+                ], style={"textAlign": "center", "padding": "40px"}),
 
             ], style={"textAlign": "center", "padding": "40px"}),
-
-        ], style={"textAlign": "center", "padding": "40px"}),
-        html.Footer("Created by Celeste Monge", style={"textAlign": "center", "color": "gray", "paddingBottom": "30px", "fontSize": "16px"})
-    ], 
-    style={
-        "backgroundImage": "url('/assets/fondo.jpg')",
-        "backgroundSize": "cover",
-        "backgroundPosition": "center",
-        "minHeight": "100vh",
-        "padding": "20px",
-        "color": "white"
-    })
-])
+            html.Footer("Created by Celeste Monge", style={"textAlign": "center", "color": "gray", "paddingBottom": "30px", "fontSize": "16px"})
+        ], 
+        style={
+            "backgroundImage": "url('/assets/fondo.jpg')",
+            "backgroundSize": "cover",
+            "backgroundPosition": "center",
+            "minHeight": "100vh",
+            "padding": "20px",
+            "color": "white"
+        })
+    ])
 
 # Create function to wrap graph layouts with back button
-def graph_layout(title, description, controls, graph_id):
+def graph_layout(title, description, controls, graph_id, footer=None):
     return html.Div([
         
     html.Div([
@@ -251,7 +351,8 @@ def graph_layout(title, description, controls, graph_id):
             "fontSize": "16px"
         }),
         *controls,
-        dcc.Graph(id=graph_id)
+        dcc.Graph(id=graph_id),
+        *(footer or [])
 
     ], style={
         "backgroundColor": "white",
@@ -270,186 +371,208 @@ def graph_layout(title, description, controls, graph_id):
 })
 
 
-# Layouts for each hypothesis
-h1_layout = graph_layout(
-    "Education Investment vs. Graduation Rates",
-    "Compare how much countries invest in tertiary education versus their graduation outcomes. Bachelor graduation is on the Y-axis, education investment on the X-axis, and Master graduation is shown as the size of each bubble.",
-    [
-        html.Label("Select Year:"),
-        dcc.Dropdown(
-            id="h1-year",
-            options=[{"label": y, "value": y} for y in sorted(df["Year"].unique())],
-            value=df["Year"].min(),
-            style={"marginBottom": "20px"}
-        ),
+# Barra de progreso de un callback en segundo plano (visible mientras corre)
+def progress_bar(progress_id):
+    return html.Div([
+        html.Progress(id=progress_id, value="0", max="1", style={"width": "60%", "marginRight": "10px"}),
+        html.Span(id=f"{progress_id}-text", style={"color": "#444"})
+    ], id=f"{progress_id}-box", style={"display": "none"})
 
-        html.Label("Select Degree Type:"),
-        dcc.Dropdown(
-            id="h1-degree-mode",
-            options=[
-                {"label": "Bachelor only", "value": "bachelor"},
-                {"label": "Master only", "value": "master"},
-                {"label": "Both (bubble size shows Master)", "value": "both"}
-            ],
-            value="both",
-            style={"marginBottom": "20px"}
-        ),
 
-        html.Label("Select Countries:"),
-        dcc.Dropdown(
-            id="h1-countries",
-            options=[{"label": c, "value": c} for c in sorted(df["Country"].unique())],
-            value=sorted(df["Country"].unique())[:5],
-            multi=True,
-            placeholder="Select countries...",
-            style={
-                "borderRadius": "10px",
-                "padding": "10px",
-                "fontSize": "16px",
-                "boxShadow": "0 0 10px rgba(0,0,0,0.1)",
-                "backgroundColor": "#f8f9fa",
-                "border": "1px solid #ced4da",
-                "marginBottom": "30px"
-            }
+# Modo de año y rango de años (los modos agregados ignoran el año elegido)
+def year_range_controls(prefix, ds, all_years=False):
+    return html.Div([
+        dcc.RadioItems(
+            id=f"{prefix}-agg",
+            options=[{"label": label, "value": value} for value, label in year_modes.items()
+                     if all_years or value != "all"],
+            value="year",
+            inline=True,
+            style={"marginBottom": "10px"}
+        ),
+        html.Label("Year range (aggregated modes):"),
+        dcc.RangeSlider(
+            id=f"{prefix}-range",
+            min=int(ds.years[0]),
+            max=int(ds.years[-1]),
+            step=1,
+            value=[int(ds.years[0]), int(ds.years[-1])],
+            marks=ds.marks
         )
-    ],
-    "h1-graph"
-)
+    ], style={"marginBottom": "20px"})
 
 
+# Filas del año elegido o, en los modos de rango, una fila por país con el
+# agregado de los años del rango (sumas prefijas, sin recorrer el panel)
+def year_slice(ds, year, agg="year", year_range=None):
+    if agg == "year":
+        return ds.panel.year(year)
+    start, end = year_range or [ds.years[0], ds.years[-1]]
+    if agg == "all":
+        return ds.panel.year_span(start, end)
+    return ds.aggregates.frame(agg, start, end).assign(Year=end)
 
 
-h2_layout = graph_layout(
-    "Graduation Rate vs. Employment Rate by Gender",
-    "This chart compares graduation rates with employment rates for females and males in each country.",
-    [
-        html.Label("Select Year:"),
-        dcc.Dropdown(
-            id="h2-year",
-            options=[{"label": y, "value": y} for y in sorted(df["Year"].unique())],
-            value=df["Year"].min()
-        ),
-        html.Label("Select Degree Type:"),
-        dcc.Dropdown(
-            id="h2-degree",
-            options=[
-                {"label": "Bachelor", "value": "BachelorRate"},
-                {"label": "Master", "value": "MasterRate"}
-            ],
-            value="BachelorRate"
-        )
-    ],
-    "h2-graph"
-)
+# Nubes grandes (todos los años de un panel grande): muestreo por rejilla
+# hasta POINT_BUDGET puntos y aviso en el gráfico de cuántos se muestran
+def thin_scatter(dff, x, y):
+    sample = grid_sample(dff, x, y)
+    note = f"Showing {len(sample):,} of {len(dff):,} points" if len(sample) < len(dff) else None
+    return sample, note
 
 
-h3_layout = graph_layout(
-    "Impact of Educational Investment on Employability by Gender Over Time",
-    "This line chart allows you to explore how male and female employment rates evolve over the years in a selected country, in relation to investment in education.",
-    [
-        html.Label("Select Country:"),
-        dcc.Dropdown(
-            id="h3-country",
-            options=[{"label": c, "value": c} for c in sorted(df["Country"].unique())],
-            value=sorted(df["Country"].unique())[0],
-            style={
-                "borderRadius": "10px",
-                "padding": "10px",
-                "fontSize": "16px",
-                "width": "60%",
-                "marginBottom": "20px"
-            }
+def add_sample_note(fig, note):
+    if note:
+        fig.add_annotation(
+            text=note, xref="paper", yref="paper", x=1, y=1.06, showarrow=False,
+            xanchor="right", font=dict(size=12, color="#666")
         )
-    ],
-    "h3-graph"
-)
 
-years = sorted(df["Year"].unique())
-marks = {int(y): str(y) for y in years}
-
-map_layout = html.Div([
-    html.A("← Back to Home", href="/", style={
-        "display": "inline-block",
-        "marginBottom": "20px",
-        "color": "#1f2a40",
-        "fontWeight": "bold",
-        "textDecoration": "none"
-    }),
-    html.H2("Interactive Map", style={
-        "textAlign": "center",
-        "color": "#1f2a40",
-        "marginBottom": "20px"
-    }),
-    html.Label("Select Variable to Display:", style={"fontWeight": "bold", "marginLeft": "20px"}),
-    dcc.Dropdown(
-        id="map-variable-dropdown",
-        options=[
-            {"label": "Education Expenditure (Million €)", "value": "Expenditure"},
-            {"label": "Graduation Rate Bachelor (%)", "value": "BachelorRate"},
-            {"label": "Graduation Rate Master (%)", "value": "MasterRate"},
-            {"label": "Employment Rate Females (%)", "value": "EmploymentRate_Females"},
-            {"label": "Employment Rate Males (%)", "value": "EmploymentRate_Males"}
+
+# Texto del año o rango para los títulos
+def year_label(year, agg="year", year_range=None):
+    if agg == "year":
+        return str(year)
+    start, end = year_range or ["", ""]
+    return f"{year_modes[agg]} {start}–{end}"
+
+
+# Entradas de los modos de año que cuentan para la figura (cached_figure): el
+# rango no cuenta en el modo de un año y el año no cuenta en los de rango.
+# `year_at` / `agg_at` son las posiciones del año y del modo (el rango va
+# justo después del modo)
+def year_mode_inputs(year_at, agg_at):
+    def normalize(*args):
+        args = list(args)
+        if len(args) <= agg_at + 1:  # modo y rango por defecto
+            return tuple(args)
+        if args[agg_at] == "year":
+            args[agg_at + 1] = None
+        else:
+            args[year_at] = None
+        return tuple(args)
+    return normalize
+
+
+# Los ejes muestran crecimiento anual en el modo CAGR
+def axis_label(label, agg="year"):
+    return f"{label} – growth % per year" if agg == "cagr" else label
+
+
+# Layouts for each hypothesis
+def build_h1_layout(ds):
+    return graph_layout(
+        "Education Investment vs. Graduation Rates",
+        "Compare how much countries invest in tertiary education versus their graduation outcomes. Bachelor graduation is on the Y-axis, education investment on the X-axis, and Master graduation is shown as the size of each bubble.",
+        [
+            html.Label("Select Year:"),
+            dcc.Dropdown(
+                id="h1-year",
+                options=ds.year_options,
+                value=ds.years[0],
+                style={"marginBottom": "10px"}
+            ),
+            year_range_controls("h1", ds, all_years=True),
+
+            html.Label("Select Degree Type:"),
+            dcc.Dropdown(
+                id="h1-degree-mode",
+                options=[
+                    {"label": "Bachelor only", "value": "bachelor"},
+                    {"label": "Master only", "value": "master"},
+                    {"label": "Both (bubble size shows Master)", "value": "both"}
+                ],
+                value="both",
+                style={"marginBottom": "20px"}
+            ),
+
+            html.Label("Select Countries:"),
+            dcc.Dropdown(
+                id="h1-countries",
+                options=ds.country_options,
+                value=ds.countries[:5],
+                multi=True,
+                placeholder="Select countries...",
+                style={
+                    "borderRadius": "10px",
+                    "padding": "10px",
+                    "fontSize": "16px",
+                    "boxShadow": "0 0 10px rgba(0,0,0,0.1)",
+                    "backgroundColor": "#f8f9fa",
+                    "border": "1px solid #ced4da",
+                    "marginBottom": "30px"
+                }
+            )
         ],
-        value="Expenditure",
-        clearable=False,
-        style={"width": "60%", "margin": "0 auto 30px auto"}
-    ),
-    html.Label("Select Year:", style={"fontWeight": "bold", "marginLeft": "20px"}),
-    dcc.Slider(
-        id="map-year-slider",
-        min=int(years[0]),
-        max=int(years[-1]),
-        step=1,
-        value=int(years[0]),
-        marks=marks,
-        tooltip={"placement": "bottom", "always_visible": True},
-        updatemode='drag'
-    ),
-    dcc.Graph(id="map-graph", style={"height": "700px", "marginTop": "30px"})
-], style={"maxWidth": "1000px", "margin": "auto", "padding": "20px"})
-
-
-custom_layout = graph_layout(
-    "Custom Chart Builder",
-    "Select the variables you want to plot and compare from the dataset.",
-    [
-        html.Label("Select X-Axis Variable:"),
-        dcc.Dropdown(
-            id="custom-x",
-            options=[{"label": col, "value": col} for col in df.columns if df[col].dtype != "object"],
-            value="Expenditure",
-            style={"marginBottom": "20px"}
-        ),
+        "h1-graph"
+    )
 
-        html.Label("Select Y-Axis Variable:"),
-        dcc.Dropdown(
-            id="custom-y",
-            options=[{"label": col, "value": col} for col in df.columns if df[col].dtype != "object"],
-            value="BachelorRate",
-            style={"marginBottom": "20px"}
-        ),
 
-        html.Label("Select Year:"),
-        dcc.Dropdown(
-            id="custom-year",
-            options=[{"label": y, "value": y} for y in sorted(df["Year"].unique())],
-            value=df["Year"].min(),
-            style={"marginBottom": "20px"}
-        ),
+def build_h2_layout(ds):
+    return graph_layout(
+        "Graduation Rate vs. Employment Rate by Gender",
+        "This chart compares graduation rates with employment rates for females and males in each country.",
+        [
+            html.Label("Select Year:"),
+            dcc.Dropdown(
+                id="h2-year",
+                options=ds.year_options,
+                value=ds.years[0],
+                style={"marginBottom": "10px"}
+            ),
+            year_range_controls("h2", ds),
+            html.Label("Select Degree Type:"),
+            dcc.Dropdown(
+                id="h2-degree",
+                options=[
+                    {"label": "Bachelor", "value": "BachelorRate"},
+                    {"label": "Master", "value": "MasterRate"}
+                ],
+                value="BachelorRate"
+            )
+        ],
+        "h2-graph"
+    )
 
-        html.Label("Select Countries (optional):"),
-        dcc.Dropdown(
-            id="custom-countries",
-            options=[{"label": c, "value": c} for c in sorted(df["Country"].unique())],
-            value=[],
-            multi=True,
-            placeholder="Leave empty to show all countries"
-        )
-    ],
-    "custom-graph"
-)
-anomaly_layout = html.Div([
-    html.Div([
+
+def build_h3_layout(ds):
+    return graph_layout(
+        "Impact of Educational Investment on Employability by Gender Over Time",
+        "This line chart allows you to explore how male and female employment rates evolve over the years in a selected country, in relation to investment in education.",
+        [
+            html.Label("Select Country:"),
+            dcc.Dropdown(
+                id="h3-country",
+                options=ds.country_options,
+                value=ds.countries[0],
+                style={
+                    "borderRadius": "10px",
+                    "padding": "10px",
+                    "fontSize": "16px",
+                    "width": "60%",
+                    "marginBottom": "20px"
+                }
+            ),
+            html.Label("Trend and 3-year forecast:"),
+            dcc.RadioItems(
+                id="h3-trend",
+                options=[
+                    {"label": "None", "value": "none"},
+                    {"label": "Linear", "value": "linear"},
+                    {"label": "Robust (Theil-Sen)", "value": "robust"},
+                ],
+                value="linear",
+                inline=True,
+                style={"marginBottom": "20px"}
+            )
+        ],
+        "h3-graph",
+        footer=[html.Div(id="h3-ranking", style={"marginTop": "30px"})]
+    )
+
+
+def build_map_layout(ds):
+    return html.Div([
         html.A("← Back to Home", href="/", style={
             "display": "inline-block",
             "marginBottom": "20px",
@@ -457,131 +580,248 @@ anomaly_layout = html.Div([
             "fontWeight": "bold",
             "textDecoration": "none"
         }),
-        html.H3("Anomaly Detection in Education and Employment Data", style={
-            "marginTop": "10px",
-            "fontSize": "28px",
-            "color": "#1f2a40"
-        }),
-        html.P("Identify unusual data points in investment, graduation, or employment metrics using the Interquartile Range (IQR) method.", style={
-            "color": "#444",
-            "fontSize": "16px"
+        html.H2("Interactive Map", style={
+            "textAlign": "center",
+            "color": "#1f2a40",
+            "marginBottom": "20px"
         }),
-        html.Label("Select Metric to Analyze:"),
+        html.Label("Select Variable to Display:", style={"fontWeight": "bold", "marginLeft": "20px"}),
         dcc.Dropdown(
-            id="anomaly-metric",
+            id="map-variable-dropdown",
             options=[
-                {"label": "Education Expenditure", "value": "Expenditure"},
-                {"label": "Bachelor Graduation Rate", "value": "BachelorRate"},
-                {"label": "Master Graduation Rate", "value": "MasterRate"},
-                {"label": "Employment Rate (Females)", "value": "EmploymentRate_Females"},
-                {"label": "Employment Rate (Males)", "value": "EmploymentRate_Males"},
+                {"label": "Education Expenditure (Million €)", "value": "Expenditure"},
+                {"label": "Graduation Rate Bachelor (%)", "value": "BachelorRate"},
+                {"label": "Graduation Rate Master (%)", "value": "MasterRate"},
+                {"label": "Employment Rate Females (%)", "value": "EmploymentRate_Females"},
+                {"label": "Employment Rate Males (%)", "value": "EmploymentRate_Males"}
             ],
             value="Expenditure",
-            style={
-                "borderRadius": "10px",
-                "padding": "10px",
-                "fontSize": "16px",
-                "width": "60%",
-                "marginBottom": "30px"
-            }
+            clearable=False,
+            style={"width": "60%", "margin": "0 auto 30px auto"}
         ),
+        html.Label("Select Year:", style={"fontWeight": "bold", "marginLeft": "20px"}),
+        dcc.Slider(
+            id="map-year-slider",
+            min=int(ds.years[0]),
+            max=int(ds.years[-1]),
+            step=1,
+            value=int(ds.years[0]),
+            marks=ds.marks,
+            tooltip={"placement": "bottom", "always_visible": True},
+            updatemode='drag'
+        ),
+        html.Div(year_range_controls("map", ds), style={"margin": "30px 20px 0 20px"}),
+        dcc.Store(id="map-data", data=build_map_bundle(ds)),
+        dcc.Graph(id="map-graph", figure=update_map("Expenditure", int(ds.years[0]), ds.name),
+                  style={"height": "700px", "marginTop": "30px"})
+    ], style={"maxWidth": "1000px", "margin": "auto", "padding": "20px"})
+
+
+def build_custom_layout(ds):
+    return graph_layout(
+        "Custom Chart Builder",
+        "Select the variables you want to plot and compare from the dataset.",
+        [
+            html.Label("Select X-Axis Variable:"),
+            dcc.Dropdown(
+                id="custom-x",
+                options=ds.numeric_options,
+                value="Expenditure",
+                style={"marginBottom": "20px"}
+            ),
+
+            html.Label("Select Y-Axis Variable:"),
+            dcc.Dropdown(
+                id="custom-y",
+                options=ds.numeric_options,
+                value="BachelorRate",
+                style={"marginBottom": "20px"}
+            ),
+
+            html.Label("Select Year:"),
+            dcc.Dropdown(
+                id="custom-year",
+                options=ds.year_options,
+                value=ds.years[0],
+                style={"marginBottom": "10px"}
+            ),
+            year_range_controls("custom", ds, all_years=True),
+
+            html.Label("Select Countries (optional):"),
+            dcc.Dropdown(
+                id="custom-countries",
+                options=ds.country_options,
+                value=[],
+                multi=True,
+                placeholder="Leave empty to show all countries"
+            )
+        ],
+        "custom-graph"
+    )
+
+
+def build_anomaly_layout(ds):
+    return html.Div([
         html.Div([
-    html.H3("What is an Anomaly?", style={
-        "fontSize": "24px", "marginBottom": "10px", "color": "#1f2a40"
-    }),
-    html.P("An anomaly is a value that stands out because it's much higher or lower than most other values. "
-           "We use a simple statistical method to detect them based on quartiles and the interquartile range (IQR):", 
-           style={"fontSize": "16px", "color": "#333"}),
-    html.Ul([
-        html.Li("Q1 = 25th percentile (lower bound of the 'normal' range)"),
-        html.Li("Q3 = 75th percentile (upper bound of the 'normal' range)"),
-        html.Li("IQR = Q3 - Q1"),
-        html.Li("Lower limit = Q1 - 1.5 × IQR"),
-        html.Li("Upper limit = Q3 + 1.5 × IQR")
-    ], style={"fontSize": "15px", "color": "#333", "paddingLeft": "20px"}),
-    html.P("Any value outside this range is flagged as an anomaly.", style={
-        "fontSize": "16px", "color": "#333", "marginTop": "10px", "fontStyle": "italic"
-    }),
-        ], style={
-            "backgroundColor": "#ffffff",
-            "padding": "30px",
-            "margin": "30px auto",
-            "borderRadius": "12px",
-            "boxShadow": "none",
-            "maxWidth": "900px"
+            html.A("← Back to Home", href="/", style={
+                "display": "inline-block",
+                "marginBottom": "20px",
+                "color": "#1f2a40",
+                "fontWeight": "bold",
+                "textDecoration": "none"
+            }),
+            html.H3("Anomaly Detection in Education and Employment Data", style={
+                "marginTop": "10px",
+                "fontSize": "28px",
+                "color": "#1f2a40"
+            }),
+            html.P("Identify unusual data points in investment, graduation, or employment metrics using the Interquartile Range (IQR) method.", style={
+                "color": "#444",
+                "fontSize": "16px"
+            }),
+            html.Label("Select Metric to Analyze:"),
+            dcc.Dropdown(
+                id="anomaly-metric",
+                options=[
+                    {"label": "Education Expenditure", "value": "Expenditure"},
+                    {"label": "Bachelor Graduation Rate", "value": "BachelorRate"},
+                    {"label": "Master Graduation Rate", "value": "MasterRate"},
+                    {"label": "Employment Rate (Females)", "value": "EmploymentRate_Females"},
+                    {"label": "Employment Rate (Males)", "value": "EmploymentRate_Males"},
+                ],
+                value="Expenditure",
+                style={
+                    "borderRadius": "10px",
+                    "padding": "10px",
+                    "fontSize": "16px",
+                    "width": "60%",
+                    "marginBottom": "30px"
+                }
+            ),
+            html.Label("Compare Each Value Against:"),
+            dcc.RadioItems(
+                id="anomaly-scope",
+                options=[
+                    {"label": "All data", "value": "all"},
+                    {"label": "Same year", "value": "year"},
+                    {"label": "Same country", "value": "country"},
+                ],
+                value="all",
+                inline=True,
+                style={"marginBottom": "30px"}
+            ),
+            html.Div([
+        html.H3("What is an Anomaly?", style={
+            "fontSize": "24px", "marginBottom": "10px", "color": "#1f2a40"
+        }),
+        html.P("An anomaly is a value that stands out because it's much higher or lower than most other values. "
+               "We use a simple statistical method to detect them based on quartiles and the interquartile range (IQR):", 
+               style={"fontSize": "16px", "color": "#333"}),
+        html.Ul([
+            html.Li("Q1 = 25th percentile (lower bound of the 'normal' range)"),
+            html.Li("Q3 = 75th percentile (upper bound of the 'normal' range)"),
+            html.Li("IQR = Q3 - Q1"),
+            html.Li("Lower limit = Q1 - 1.5 × IQR"),
+            html.Li("Upper limit = Q3 + 1.5 × IQR")
+        ], style={"fontSize": "15px", "color": "#333", "paddingLeft": "20px"}),
+        html.P("Any value outside this range is flagged as an anomaly.", style={
+            "fontSize": "16px", "color": "#333", "marginTop": "10px", "fontStyle": "italic"
         }),
+            ], style={
+                "backgroundColor": "#ffffff",
+                "padding": "30px",
+                "margin": "30px auto",
+                "borderRadius": "12px",
+                "boxShadow": "none",
+                "maxWidth": "900px"
+            }),
 
-        dcc.Graph(id="anomaly-graph"),
-        html.Div(id="anomaly-table")
+            progress_bar("anomaly-progress"),
+            dcc.Graph(id="anomaly-graph"),
+            html.Div(id="anomaly-table")
 
+        ], style={
+            "backgroundColor": "white",
+            "padding": "40px",
+            "maxWidth": "1000px",
+            "margin": "60px auto",
+            "boxShadow": "none",
+            "borderRadius": "16px",
+            "animation": "fadeIn 1.2s ease-in-out",
+            "fontFamily": "Arial, sans-serif"
+        })
     ], style={
-        "backgroundColor": "white",
-        "padding": "40px",
-        "maxWidth": "1000px",
-        "margin": "60px auto",
-        "boxShadow": "none",
-        "borderRadius": "16px",
-        "animation": "fadeIn 1.2s ease-in-out",
-        "fontFamily": "Arial, sans-serif"
-    })
-], style={
     "backgroundColor": "#ffffff",
     "minHeight": "100vh",
     "padding": "40px"
 })
 
 
-df["Efficiency_Graduation"] = df["BachelorRate"] / df["Expenditure"]
-df["Efficiency_Employment_Females"] = df["EmploymentRate_Females"] / df["Expenditure"]
-df["Efficiency_Employment_Males"] = df["EmploymentRate_Males"] / df["Expenditure"]
-efficiency_layout = html.Div([
-    html.Div([
-        html.A("← Back to Home", href="/", style={
-            "display": "inline-block",
-            "marginBottom": "20px",
-            "color": "#1f2a40",
-            "fontWeight": "bold",
-            "textDecoration": "none"
-        }),
-        html.H3("Educational and Employment Efficiency Index by Country", style={
-            "marginTop": "10px",
-            "fontSize": "28px",
-            "color": "#1f2a40"
-        }),
-        html.P("This section shows efficiency indicators calculated as graduation or employment rate divided by education expenditure. Compare how effectively countries turn investment into results.", style={
-            "color": "#444",
-            "fontSize": "16px",
-            "marginBottom": "30px"
-        }),
-
-        # Selector de año
-        html.Label("Select Year:"),
-        dcc.Dropdown(
-            id="efficiency-year",
-            options=[{"label": y, "value": y} for y in sorted(df["Year"].unique())],
-            value=df["Year"].min(),
-            style={"marginBottom": "30px", "width": "40%"}
-        ),
-
-        # Gráfico eficiencia graduación
-        dcc.Graph(id="efficiency-grad-graph"),
-
-        # Gráfico eficiencia empleo femenino
-        dcc.Graph(id="efficiency-emp-female-graph"),
-
-        # Gráfico eficiencia empleo masculino
-        dcc.Graph(id="efficiency-emp-male-graph"),
+def build_efficiency_layout(ds):
+    return html.Div([
+        html.Div([
+            html.A("← Back to Home", href="/", style={
+                "display": "inline-block",
+                "marginBottom": "20px",
+                "color": "#1f2a40",
+                "fontWeight": "bold",
+                "textDecoration": "none"
+            }),
+            html.H3("Educational and Employment Efficiency Index by Country", style={
+                "marginTop": "10px",
+                "fontSize": "28px",
+                "color": "#1f2a40"
+            }),
+            html.P("This section shows efficiency indicators calculated as graduation or employment rate divided by education expenditure. Compare how effectively countries turn investment into results.", style={
+                "color": "#444",
+                "fontSize": "16px",
+                "marginBottom": "30px"
+            }),
+
+            # Selector de año
+            html.Label("Select Year:"),
+            dcc.Dropdown(
+                id="efficiency-year",
+                options=ds.year_options,
+                value=ds.years[0],
+                style={"marginBottom": "10px", "width": "40%"}
+            ),
+            year_range_controls("efficiency", ds),
+
+            # Todos los países o solo los extremos del ranking
+            dcc.RadioItems(
+                id="efficiency-show",
+                options=[
+                    {"label": "All countries", "value": "all"},
+                    {"label": "Top 10", "value": "top"},
+                    {"label": "Bottom 10", "value": "bottom"},
+                ],
+                value="all",
+                inline=True,
+                style={"marginBottom": "30px"}
+            ),
+
+            progress_bar("efficiency-progress"),
+
+            # Gráfico eficiencia graduación
+            dcc.Graph(id="efficiency-grad-graph"),
+
+            # Gráfico eficiencia empleo femenino
+            dcc.Graph(id="efficiency-emp-female-graph"),
+
+            # Gráfico eficiencia empleo masculino
+            dcc.Graph(id="efficiency-emp-male-graph"),
 
+        ], style={
+            "backgroundColor": "white",
+            "padding": "40px",
+            "maxWidth": "1000px",
+            "margin": "60px auto",
+            "boxShadow": "none",
+            "borderRadius": "16px",
+            "fontFamily": "Arial, sans-serif"
+        })
     ], style={
-        "backgroundColor": "white",
-        "padding": "40px",
-        "maxWidth": "1000px",
-        "margin": "60px auto",
-        "boxShadow": "none",
-        "borderRadius": "16px",
-        "fontFamily": "Arial, sans-serif"
-    })
-], style={
     "backgroundColor": "#ffffff",
     "minHeight": "100vh",
     "padding": "40px"
@@ -589,44 +829,75 @@ efficiency_layout = html.Div([
 
 
 
-# Routing callback
-@app.callback(Output('page-content', 'children'), Input('url', 'pathname'))
-def display_page(pathname):
-    if pathname == '/hypothesis1':
-        return h1_layout
-    elif pathname == '/hypothesis2':
-        return h2_layout
-    elif pathname == '/hypothesis3':
-        return h3_layout
-    elif pathname == '/map':
-        return map_layout
-    elif pathname == '/custom':
-        return custom_layout
-    elif pathname == '/anomalies':
-        return anomaly_layout
-    elif pathname == "/efficiency":
-        return efficiency_layout
+# Páginas por ruta; cada layout se construye en la primera visita
+pages = {
+    "/": build_home_layout,
+    "/hypothesis1": build_h1_layout,
+    "/hypothesis2": build_h2_layout,
+    "/hypothesis3": build_h3_layout,
+    "/map": build_map_layout,
+    "/custom": build_custom_layout,
+    "/anomalies": build_anomaly_layout,
+    "/efficiency": build_efficiency_layout,
+}
+
+# Layouts ya serializados, uno por página
+layout_cache = FigureCache(maxsize=4 * len(pages), version=lambda: datasets.generation)
+
+
+@cached_figure(layout_cache, flight=figure_flight)
+def render_page(pathname, dataset):
+    ds = datasets.get(dataset)
+    # El panel de la página viaja con ella: los callbacks lo leen como State
+    return html.Div([dcc.Store(id="page-dataset", data=ds.name), pages[pathname](ds)])
+
+
+# Routing callback: el panel viene de ?dataset=... o del último elegido en la sesión
+@app.callback(
+    [Output('page-content', 'children'), Output('active-dataset', 'data')],
+    [Input('url', 'pathname'), Input('url', 'search')],
+    [State('active-dataset', 'data')]
+)
+def display_page(pathname, search=None, active=None):
+    if pathname not in pages:
+        pathname = "/"
+    requested = parse_qs((search or "").lstrip("?")).get("dataset", [active])[0]
+    dataset = datasets.resolve(requested)
+    return render_page(pathname, dataset), dataset
 
-    else:
-        return home_layout
+
+# Cambiar de panel desde la portada
+@app.callback(
+    Output('url', 'search'),
+    Input('dataset-select', 'value'),
+    prevent_initial_call=True
+)
+def select_dataset(dataset):
+    return f"?dataset={dataset}"
+
+# KPIs de la portada para el rango de años elegido
+@app.callback(
+    Output("home-kpis", "children"),
+    Input("home-years", "value"),
+    State("page-dataset", "data"),
+    prevent_initial_call=True
+)
+def update_home_kpis(year_range, dataset=None):
+    with phase("pandas"):
+        return build_insight_cards(datasets.get(dataset), *(year_range or [None, None]))
 
 # Graph Callbacks
 @app.callback(
     Output("h1-graph", "figure"),
-    [Input("h1-year", "value"), Input("h1-countries", "value"), Input("h1-degree-mode", "value")]
+    [Input("h1-year", "value"), Input("h1-countries", "value"), Input("h1-degree-mode", "value"),
+     Input("h1-agg", "value"), Input("h1-range", "value")],
+    [State("page-dataset", "data")]
 )
-def update_h1_graph(year, selected_countries, mode):
-    dff = df[(df["Year"] == year) & (df["Country"].isin(selected_countries))]
-
-    if dff.empty:
-        fig = px.scatter()
-        fig.add_annotation(
-            text="No data available for the selected filters.",
-            xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False,
-            font=dict(size=20, color="red")
-        )
-        fig.update_layout(plot_bgcolor="white", paper_bgcolor="white")
-        return fig
+@cached_figure(figure_cache, baked_figures, figure_flight, year_mode_inputs(0, 3))
+def update_h1_graph(year, selected_countries, mode, agg="year", year_range=None, dataset=None):
+    with phase("pandas"):
+        dff = year_slice(datasets.get(dataset), year, agg, year_range)
+        dff = dff[dff["Country"].isin(selected_countries or [])]
 
     if mode == "bachelor":
         y_col = "BachelorRate"
@@ -641,17 +912,38 @@ def update_h1_graph(year, selected_countries, mode):
         size_col = "MasterRate"
         title = "Investment vs. Bachelor (Y) + Master (Size)"
 
+    # Un crecimiento negativo no puede ser tamaño de burbuja
+    if agg == "cagr":
+        size_col = None
+
+    # Un tamaño sin dato no se puede dibujar (paneles sin tasa de máster)
+    if size_col:
+        dff = dff.dropna(subset=[size_col])
+
+    if dff.empty:
+        fig = px.scatter()
+        fig.add_annotation(
+            text="No data available for the selected filters.",
+            xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False,
+            font=dict(size=20, color="red")
+        )
+        fig.update_layout(plot_bgcolor="white", paper_bgcolor="white")
+        return fig
+
+    dff, note = thin_scatter(dff, "Expenditure", y_col)
     fig = px.scatter(
         dff,
         x="Expenditure",
         y=y_col,
         size=size_col,
-        color="Country",
+        color=color_column(dff, "Country"),
         hover_name="Country",
+        hover_data=["Year"] if agg == "all" else None,
+        render_mode=render_mode(len(dff)),
         labels={
-            "Expenditure": "Education Expenditure (Million €)",
-            y_col: f"{y_col.replace('Rate', '')} Graduation Rate (%)",
-            "MasterRate": "Master Graduation Rate (%)"
+            "Expenditure": axis_label("Education Expenditure (Million €)", agg),
+            y_col: axis_label(f"{y_col.replace('Rate', '')} Graduation Rate (%)", agg),
+            "MasterRate": axis_label("Master Graduation Rate (%)", agg)
         },
         size_max=60,
         color_discrete_sequence=px.colors.diverging.Portland  # strong/vibrant yellow-orange-blue
@@ -660,9 +952,9 @@ def update_h1_graph(year, selected_countries, mode):
     fig.update_traces(marker=dict(line=dict(width=1, color="black")))
 
     fig.update_layout(
-        title=title + f" – {year}",
-        xaxis_title="Education Expenditure (Million €)",
-        yaxis_title=f"{y_col.replace('Rate', '')} Graduation Rate (%)",
+        title=title + f" – {year_label(year, agg, year_range)}",
+        xaxis_title=axis_label("Education Expenditure (Million €)", agg),
+        yaxis_title=axis_label(f"{y_col.replace('Rate', '')} Graduation Rate (%)", agg),
         font=dict(family="Arial", size=14),
         height=650,
         plot_bgcolor="white",
@@ -670,16 +962,26 @@ def update_h1_graph(year, selected_countries, mode):
         legend_title="Country",
         transition={"duration": 1000, "easing": "cubic-in-out"}
     )
+    add_sample_note(fig, note)
 
     return fig
 
 
 @app.callback(
     Output("h2-graph", "figure"),
-    [Input("h2-year", "value"), Input("h2-degree", "value")]
+    [Input("h2-year", "value"), Input("h2-degree", "value"), Input("h2-agg", "value"), Input("h2-range", "value")],
+    [State("page-dataset", "data")]
 )
-def update_h2_graph(year, degree_col):
-    dff = df_long[df_long["Year"] == year].dropna(subset=[degree_col, "EmploymentRate"])
+@cached_figure(figure_cache, baked_figures, figure_flight, year_mode_inputs(0, 2))
+def update_h2_graph(year, degree_col, agg="year", year_range=None, dataset=None):
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        if agg == "year":
+            dff = ds.long_panel.year(year)
+        else:
+            # agregado por país y después a formato largo (una fila por sexo)
+            dff = melt_employment(year_slice(ds, year, agg, year_range))
+        dff = dff.dropna(subset=[degree_col, "EmploymentRate"])
 
     if dff.empty:
         return px.scatter(title="No data available for the selected year.")
@@ -692,8 +994,8 @@ def update_h2_graph(year, degree_col):
         facet_col="Sex",
         hover_name="Country",
         labels={
-            degree_col: f"{degree_col.replace('Rate', '')} Graduation Rate (%)",
-            "EmploymentRate": "Employment Rate (%)",
+            degree_col: axis_label(f"{degree_col.replace('Rate', '')} Graduation Rate (%)", agg),
+            "EmploymentRate": axis_label("Employment Rate (%)", agg),
             "Sex": "Gender"
         },
         color_discrete_sequence=px.colors.sequential.YlOrBr + px.colors.sequential.Blues[::-1],
@@ -701,7 +1003,7 @@ def update_h2_graph(year, degree_col):
     )
 
     fig.update_layout(
-        title=f"Graduation Rate vs Employment Rate by Gender – {year}",
+        title=f"Graduation Rate vs Employment Rate by Gender – {year_label(year, agg, year_range)}",
         font=dict(family="Arial", size=15),
         plot_bgcolor="#f9f9f9",
         paper_bgcolor="#ffffff",
@@ -711,26 +1013,37 @@ def update_h2_graph(year, degree_col):
     return fig
 
 
-@app.callback(Output("h3-graph", "figure"), Input("h3-country", "value"))
-def update_h3_graph(country):
-    dff = df[df["Country"] == country].dropna(subset=["Year", "EmploymentRate_Females", "EmploymentRate_Males"])
-
-    if dff.empty:
-        return px.line(title="No data available for the selected country.")
+# Ranking de los países que más mejoran (mismo ajuste que la tendencia)
+def build_trend_ranking(fit):
+    ranking = fit.ranking(10)
+    if ranking.empty:
+        return html.P("Not enough data to compute trends.")
+    return html.Div([
+        html.H4(f"Fastest improving countries ({fit.method} trend)", style={"color": "#1f2a40"}),
+        html.Ol([
+            html.Li(f"{row.Country}: {row.Slope:+.2f} pp per year")
+            for row in ranking.itertuples()
+        ])
+    ])
 
-    # Melt para formato largo
-    dff_long = pd.melt(
-        dff,
-        id_vars=["Year", "Expenditure"],
-        value_vars=["EmploymentRate_Females", "EmploymentRate_Males"],
-        var_name="Sex",
-        value_name="EmploymentRate"
-    )
 
-    dff_long["Sex"] = dff_long["Sex"].replace({
-        "EmploymentRate_Females": "Female",
-        "EmploymentRate_Males": "Male"
-    })
+@app.callback(
+    [Output("h3-graph", "figure"), Output("h3-ranking", "children")],
+    [Input("h3-country", "value"), Input("h3-trend", "value")],
+    [State("page-dataset", "data")]
+)
+@cached_figure(figure_cache, baked_figures, figure_flight)
+def update_h3_graph(country, trend="linear", dataset=None):
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        # Formato largo ya calculado: filas del país ordenadas por año
+        dff_long = ds.long_panel.country(country).dropna(subset=["EmploymentRate"])
+        # Tendencias de todos los países en un solo ajuste (caché por versión)
+        fit = ds.trends.fit(ds.df_long, ds.version, "linear" if trend == "none" else trend)
+
+    ranking = build_trend_ranking(fit)
+    if dff_long.empty:
+        return px.line(title="No data available for the selected country."), ranking
 
     # Gráfico
     fig = px.line(
@@ -751,6 +1064,16 @@ def update_h3_graph(country):
         height=600
     )
 
+    # Tendencia (discontinua) y previsión (punteada) por sexo
+    if trend != "none":
+        for sex, (years, fitted, ahead, forecast) in fit.lines(country).items():
+            color = {"Female": "#FFFD69", "Male": "#1E90FF"}.get(sex)
+            fig.add_scatter(x=years, y=fitted, mode="lines", name=f"{sex} trend",
+                            line=dict(color=color, dash="dash"), hoverinfo="skip")
+            fig.add_scatter(x=ahead, y=forecast, mode="lines+markers", name=f"{sex} forecast",
+                            line=dict(color=color, dash="dot"),
+                            hovertemplate=f"{sex} forecast %{{x}}: %{{y:.1f}}%<extra></extra>")
+
     fig.update_layout(
         title=f"Employment Rate by Gender in {country} Over Time",
         font=dict(family="Arial", size=15),
@@ -759,20 +1082,59 @@ def update_h3_graph(country):
         margin=dict(t=60, l=40, r=40, b=40)
     )
 
+    return fig, ranking
+
+# Barras de un indicador de eficiencia, ya ordenadas por el ranking del año.
+# El hover muestra el puesto y el del año anterior
+def efficiency_bar(ds, metric, year, show, label, title, scale, agg="year", year_range=None):
+    if agg == "year":
+        dff = ds.rankings.sorted_view(metric, year)
+        history = ds.rankings.trajectory(metric).loc[:year]
+        ranks = history.iloc[-1]
+        previous = history.iloc[-2] if len(history) > 1 else pd.Series(dtype=float)
+    else:
+        # en los modos de rango se ordena el agregado (una fila por país)
+        dff = sort_frame(year_slice(ds, year, agg, year_range), metric)
+        ranks = pd.Series(range(1, len(dff) + 1), index=dff["Country"]).where(dff[metric].notna().to_numpy())
+        previous = pd.Series(dtype=float)
+
+    if show == "top":
+        dff = top_rows(dff, metric, EFFICIENCY_TOP_K)
+    elif show == "bottom":
+        dff = bottom_rows(dff, metric, EFFICIENCY_TOP_K)
+
+    # puesto y puesto del año anterior ("–" si no tenía dato)
+    rank_label = lambda rank: "–" if pd.isna(rank) else str(int(rank))
+    label = axis_label(label, agg)
+
+    fig = px.bar(
+        dff,
+        x="Country",
+        y=metric,
+        labels={metric: label, "Country": "Country"},
+        title=title,
+        color=metric,
+        color_continuous_scale=scale,
+        height=400
+    )
+    fig.update_traces(
+        customdata=[[rank_label(ranks.get(c)), rank_label(previous.get(c))] for c in dff["Country"]],
+        hovertemplate=f"<b>%{{x}}</b><br>{label}=%{{y:.2f}}<br>Rank %{{customdata[0]}}"
+                      f" (previous year %{{customdata[1]}})<extra></extra>"
+    )
+    fig.update_layout(plot_bgcolor="white", paper_bgcolor="white")
     return fig
 
-@app.callback(
-    [
-        Output("efficiency-grad-graph", "figure"),
-        Output("efficiency-emp-female-graph", "figure"),
-        Output("efficiency-emp-male-graph", "figure")
-    ],
-    [Input("efficiency-year", "value")]
-)
-def update_efficiency_graphs(year):
-    dff = df[df["Year"] == year]
 
-    if dff.empty:
+@cached_figure(figure_cache, baked_figures, figure_flight, year_mode_inputs(0, 2))
+def update_efficiency_graphs(year, show="all", agg="year", year_range=None, dataset=None):
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        dff = year_slice(ds, year, agg, year_range)
+        period = year_label(year, agg, year_range)
+
+    # en los modos de rango hay una fila por país aunque no tenga datos
+    if dff.empty or dff[ds.rankings.metrics].isna().all(axis=None):
         no_data_fig = px.bar()
         no_data_fig.add_annotation(
             text="No data available for the selected year.",
@@ -783,65 +1145,40 @@ def update_efficiency_graphs(year):
         return no_data_fig, no_data_fig, no_data_fig
 
     # Graduación / gasto
-    fig_grad = px.bar(
-        dff.sort_values("Efficiency_Graduation", ascending=False),
-        x="Country",
-        y="Efficiency_Graduation",
-        labels={
-            "Efficiency_Graduation": "Graduation Rate / Expenditure",
-            "Country": "Country"
-        },
-        title=f"Graduation Efficiency by Country – {year}",
-        color="Efficiency_Graduation",
-        color_continuous_scale=px.colors.sequential.YlOrBr,
-        height=400
+    fig_grad = efficiency_bar(
+        ds, "Efficiency_Graduation", year, show,
+        "Graduation Rate / Expenditure",
+        f"Graduation Efficiency by Country – {period}",
+        px.colors.sequential.YlOrBr, agg, year_range
     )
-    fig_grad.update_layout(plot_bgcolor="white", paper_bgcolor="white")
 
     # Empleo femenino / gasto
-    fig_emp_female = px.bar(
-        dff.sort_values("Efficiency_Employment_Females", ascending=False),
-        x="Country",
-        y="Efficiency_Employment_Females",
-        labels={
-            "Efficiency_Employment_Females": "Employment Rate Females / Expenditure",
-            "Country": "Country"
-        },
-        title=f"Employment Efficiency (Females) by Country – {year}",
-        color="Efficiency_Employment_Females",
-        color_continuous_scale=px.colors.sequential.Blues,
-        height=400
+    fig_emp_female = efficiency_bar(
+        ds, "Efficiency_Employment_Females", year, show,
+        "Employment Rate Females / Expenditure",
+        f"Employment Efficiency (Females) by Country – {period}",
+        px.colors.sequential.Blues, agg, year_range
     )
-    fig_emp_female.update_layout(plot_bgcolor="white", paper_bgcolor="white")
 
     # Empleo masculino / gasto
-    fig_emp_male = px.bar(
-        dff.sort_values("Efficiency_Employment_Males", ascending=False),
-        x="Country",
-        y="Efficiency_Employment_Males",
-        labels={
-            "Efficiency_Employment_Males": "Employment Rate Males / Expenditure",
-            "Country": "Country"
-        },
-        title=f"Employment Efficiency (Males) by Country – {year}",
-        color="Efficiency_Employment_Males",
-        color_continuous_scale=px.colors.sequential.Blues,
-        height=400
+    fig_emp_male = efficiency_bar(
+        ds, "Efficiency_Employment_Males", year, show,
+        "Employment Rate Males / Expenditure",
+        f"Employment Efficiency (Males) by Country – {period}",
+        px.colors.sequential.Blues, agg, year_range
     )
-    fig_emp_male.update_layout(plot_bgcolor="white", paper_bgcolor="white")
 
     return fig_grad, fig_emp_female, fig_emp_male
 
 
-@app.callback(
-    Output("map-graph", "figure"),
-    [Input("map-variable-dropdown", "value"), Input("map-year-slider", "value")]
-)
-def update_map(variable, year):
-    dff = df[df["Year"] == year].copy()
-
-    # Algunos países podrían no tener datos, asignamos NaN para que sean blancos
-    dff[variable] = dff[variable].replace({0: None})  # O depende de cómo manejas datos faltantes
+# Figura base del mapa (todos los países; los que no tienen dato quedan en blanco).
+# El servidor solo la construye al cargar la página, los cambios de año y
+# variable se hacen en el navegador (assets/map.js)
+@cached_figure(figure_cache, baked_figures, figure_flight)
+def update_map(variable, year, dataset=None):
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        dff = pd.DataFrame({"Country": ds.countries, variable: ds.map_values(variable).loc[year].to_numpy()})
 
     fig = px.choropleth(
         dff,
@@ -854,6 +1191,7 @@ def update_map(variable, year):
         labels={variable: variable.replace("_", " ")},
         scope="europe"
     )
+    fig.update_traces(hovertemplate=f"<b>%{{hovertext}}</b><br><br>{variable.replace('_', ' ')}=%{{z:,.2f}}<extra></extra>")
 
     fig.update_layout(
         margin={"r":0,"t":40,"l":0,"b":0},
@@ -866,17 +1204,31 @@ def update_map(variable, year):
     return fig
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace="map", function_name="restyle"),
+    Output("map-graph", "figure"),
+    [Input("map-variable-dropdown", "value"), Input("map-year-slider", "value"),
+     Input("map-agg", "value"), Input("map-range", "value")],
+    [State("map-data", "data"), State("map-graph", "figure")],
+    prevent_initial_call=True
+)
+
+
 @app.callback(
     Output("custom-graph", "figure"),
-    [Input("custom-x", "value"), Input("custom-y", "value"), Input("custom-year", "value"), Input("custom-countries", "value")]
+    [Input("custom-x", "value"), Input("custom-y", "value"), Input("custom-year", "value"), Input("custom-countries", "value"),
+     Input("custom-agg", "value"), Input("custom-range", "value")],
+    [State("page-dataset", "data")]
 )
-def update_custom_graph(x_col, y_col, year, selected_countries):
-    dff = df[df["Year"] == year]
+@cached_figure(figure_cache, baked_figures, figure_flight, year_mode_inputs(2, 4))
+def update_custom_graph(x_col, y_col, year, selected_countries, agg="year", year_range=None, dataset=None):
+    with phase("pandas"):
+        dff = year_slice(datasets.get(dataset), year, agg, year_range)
 
-    if selected_countries:
-        dff = dff[dff["Country"].isin(selected_countries)]
+        if selected_countries:
+            dff = dff[dff["Country"].isin(selected_countries)]
 
-    dff = dff.dropna(subset=[x_col, y_col])
+        dff = dff.dropna(subset=[x_col, y_col])
 
     if dff.empty:
         fig = px.scatter()
@@ -888,15 +1240,18 @@ def update_custom_graph(x_col, y_col, year, selected_countries):
         fig.update_layout(plot_bgcolor="white", paper_bgcolor="white")
         return fig
 
+    dff, note = thin_scatter(dff, x_col, y_col)
     fig = px.scatter(
         dff,
         x=x_col,
         y=y_col,
-        color="Country",
+        color=color_column(dff, "Country"),
         hover_name="Country",
+        hover_data=["Year"] if agg == "all" and "Year" not in (x_col, y_col) else None,
+        render_mode=render_mode(len(dff)),
         labels={
-            x_col: x_col.replace("_", " "),
-            y_col: y_col.replace("_", " ")
+            x_col: axis_label(x_col.replace("_", " "), agg),
+            y_col: axis_label(y_col.replace("_", " "), agg)
         },
         color_discrete_sequence=px.colors.qualitative.Bold,
         height=600
@@ -905,51 +1260,34 @@ def update_custom_graph(x_col, y_col, year, selected_countries):
     fig.update_traces(marker=dict(size=12, line=dict(width=1, color="black")))
 
     fig.update_layout(
-        title=f"{y_col} vs {x_col} – {year}",
-        xaxis_title=x_col.replace("_", " "),
-        yaxis_title=y_col.replace("_", " "),
+        title=f"{y_col} vs {x_col} – {year_label(year, agg, year_range)}",
+        xaxis_title=axis_label(x_col.replace("_", " "), agg),
+        yaxis_title=axis_label(y_col.replace("_", " "), agg),
         font=dict(family="Arial", size=14),
         plot_bgcolor="white",
         paper_bgcolor="white",
         legend_title="Country",
         transition={"duration": 800, "easing": "cubic-in-out"}
     )
+    add_sample_note(fig, note)
 
     return fig
 
 
-@app.callback(
-    [Output("anomaly-graph", "figure"),
-     Output("anomaly-table", "children")],
-    Input("anomaly-metric", "value")
-)
-def detect_anomalies(metric):
-    dff = df[["Year", "Country", metric]].dropna()
-
-    Q1 = dff[metric].quantile(0.25)
-    Q3 = dff[metric].quantile(0.75)
-    IQR = Q3 - Q1
-    lower = Q1 - 1.5 * IQR
-    upper = Q3 + 1.5 * IQR
-
-    # Identificar outliers y razón
-    def explain(value):
-        if value < lower:
-            return f"Below normal range (Q1 - 1.5×IQR)"
-        elif value > upper:
-            return f"Above normal range (Q3 + 1.5×IQR)"
-        else:
-            return None
-
-    dff["Explanation"] = dff[metric].apply(explain)
-    outliers = dff[dff["Explanation"].notnull()]
+@cached_figure(figure_cache, baked_figures, figure_flight)
+def detect_anomalies(metric, scope="all", dataset=None):
+    # Límites IQR y explicación ya calculados para todas las métricas
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        dff = ds.anomalies.detect(ds.df, ds.version, anomaly_groups.get(scope))[metric]
+        outliers = ds.anomalies.outliers(ds.df, ds.version, metric, anomaly_groups.get(scope))
 
     # Crear gráfico sin mostrar columna de anomalía
     fig = px.scatter(
         dff,
         x="Year",
         y=metric,
-        color=dff["Explanation"].notnull().map({True: "Anomaly", False: "Normal"}),
+        color="Status",
         hover_name="Country",
         labels={
             metric: metric.replace("_", " "),
@@ -967,18 +1305,28 @@ def detect_anomalies(metric):
         margin=dict(t=60, l=40, r=40, b=40)
     )
 
-    # Crear tabla explicativa
+    # Crear tabla explicativa (los datos se cargan página a página)
     if outliers.empty:
         table = html.P("No anomalies found for this metric.", style={"marginTop": "30px", "fontSize": "16px"})
     else:
         table = dash_table.DataTable(
+            id="anomaly-datatable",
             columns=[
                 {"name": "Country", "id": "Country"},
                 {"name": "Year", "id": "Year"},
                 {"name": metric.replace("_", " "), "id": metric},
                 {"name": "Explanation", "id": "Explanation"},
             ],
-            data=outliers.to_dict("records"),
+            data=[],
+            page_action="custom",
+            page_current=0,
+            page_size=ANOMALY_PAGE_SIZE,
+            page_count=ceil(len(outliers) / ANOMALY_PAGE_SIZE),
+            sort_action="custom",
+            sort_mode="multi",
+            sort_by=[],
+            filter_action="custom",
+            filter_query="",
             style_table={"marginTop": "30px", "overflowX": "auto"},
             style_cell={
                 "textAlign": "center",
@@ -1000,11 +1348,153 @@ def detect_anomalies(metric):
     return fig, table
 
 
+# Paginación, orden y filtro de la tabla de anomalías en el servidor
+@app.callback(
+    [Output("anomaly-datatable", "data"),
+     Output("anomaly-datatable", "page_count")],
+    [Input("anomaly-datatable", "page_current"),
+     Input("anomaly-datatable", "page_size"),
+     Input("anomaly-datatable", "sort_by"),
+     Input("anomaly-datatable", "filter_query")],
+    [State("anomaly-metric", "value"),
+     State("anomaly-scope", "value"),
+     State("page-dataset", "data")]
+)
+def update_anomaly_table(page_current, page_size, sort_by, filter_query, metric, scope, dataset=None):
+    with phase("pandas"):
+        ds = datasets.get(dataset)
+        outliers = ds.anomalies.outliers(ds.df, ds.version, metric, anomaly_groups.get(scope))
+        return query_page(outliers, page_current, page_size or ANOMALY_PAGE_SIZE, sort_by, filter_query)
+
+
+# Registra `job` como callback pesado (con el nombre sin "_job"). Con el gestor
+# de background callbacks corre en otro proceso y recibe
+# set_progress((paso, total, mensaje)); se cancela al cambiar de página y Dash
+# cancela el trabajo anterior si las entradas cambian antes de que termine.
+# Sin gestor es un callback normal
+def heavy_callback(outputs, inputs, state, progress_id):
+    def decorator(job):
+        name = job.__name__.removesuffix("_job")
+        if background_manager is None:
+            @wraps(job)
+            def run(*args):
+                return job(background.no_progress, *args)
+            run.__name__ = name
+            app.callback(outputs, inputs, state)(run)
+            return job
+
+        # el trabajo se mide en su propio proceso y los tiempos vuelven por la caché
+        ship = background.ship_timing(background_manager)
+
+        @wraps(job)
+        def run_job(set_progress, *args):
+            return timed(lambda *values: job(set_progress, *values), name, ship)(*args)
+        run_job.__name__ = name
+
+        app.callback(
+            outputs, inputs, state,
+            background=True,
+            manager=background_manager,
+            progress=[Output(progress_id, "value"), Output(progress_id, "max"),
+                      Output(f"{progress_id}-text", "children")],
+            running=[(Output(f"{progress_id}-box", "style"), {"display": "block"}, {"display": "none"})],
+            cancel=[Input("url", "pathname")]
+        )(run_job)
+        return job
+    return decorator
+
+
+@heavy_callback(
+    [
+        Output("efficiency-grad-graph", "figure"),
+        Output("efficiency-emp-female-graph", "figure"),
+        Output("efficiency-emp-male-graph", "figure")
+    ],
+    [Input("efficiency-year", "value"), Input("efficiency-show", "value"),
+     Input("efficiency-agg", "value"), Input("efficiency-range", "value")],
+    [State("page-dataset", "data")],
+    "efficiency-progress"
+)
+def update_efficiency_graphs_job(set_progress, year, show="all", agg="year", year_range=None, dataset=None):
+    # el panel (y su ranking) se carga en el primer uso
+    set_progress((0, 2, "Loading the rankings..."))
+    datasets.get(dataset)
+    set_progress((1, 2, "Drawing the charts..."))
+    return update_efficiency_graphs(year, show, agg, year_range, dataset)
+
+
+@heavy_callback(
+    [Output("anomaly-graph", "figure"), Output("anomaly-table", "children")],
+    [Input("anomaly-metric", "value"), Input("anomaly-scope", "value")],
+    [State("page-dataset", "data")],
+    "anomaly-progress"
+)
+def detect_anomalies_job(set_progress, metric, scope="all", dataset=None):
+    # límites IQR de todas las métricas (una vez por versión del panel)
+    set_progress((0, 2, "Computing the IQR limits..."))
+    ds = datasets.get(dataset)
+    ds.anomalies.detect(ds.df, ds.version, anomaly_groups.get(scope))
+    set_progress((1, 2, "Drawing the chart..."))
+    return detect_anomalies(metric, scope, dataset)
+
+
+# Estado para el balanceador / orquestador
+@app.server.route("/health")
+def health():
+    ds = datasets.get()
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "dataset": ds.version,
+        "generation": datasets.generation,
+        "loaded": datasets.loaded(),
+    })
+
 
+# Recarga manual: POST /admin/reload[?dataset=...] con la cabecera
+# X-Reload-Token; sin RELOAD_TOKEN la ruta no existe. La respuesta no espera a
+# que termine y las peticiones seguidas se juntan en una sola recarga
+@app.server.route("/admin/reload", methods=["POST"])
+def reload_datasets():
+    token = os.environ.get("RELOAD_TOKEN")
+    if not token:
+        abort(404)
+    if request.headers.get("X-Reload-Token") != token:
+        abort(403)
+    names = [datasets.resolve(name) for name in request.args.getlist("dataset")] or datasets.loaded()
+    pending = datasets.reload_later(names)
+    return jsonify({"reloading": pending, "generation": datasets.generation}), 202
+
+
+# Respuestas de los callbacks codificadas con orjson (FIGURE_JSON_ENGINE)
+serialization.install()
+
+# Histogramas de latencia por callback en /metrics (formato Prometheus); con
+# METRICS_DIR (wsgi.py) suman los de todos los workers
+callback_metrics = instrument(
+    app, CallbackMetrics(os.environ.get("METRICS_DIR") or None),
+    collect=background_manager and (lambda: background.collect_timings(background_manager))
+)
 
+# Respuestas comprimidas (brotli si está instalado, gzip si no); las GET con
+# ETag para contestar 304 a lo que el navegador ya tiene. COMPRESS_RESPONSES=0
+# la desactiva
+if os.environ.get("COMPRESS_RESPONSES", "1") != "0":
+    enable_compression(app.server)
 
-if __name__ == '__main__':
-    app.run(debug=True)
 
+# Precalcular lo que todos los workers van a usar (páginas, anomalías, mapa)
+# antes del fork, para que lo compartan copy-on-write
+def warm_up():
+    ds = datasets.get()
+    for group in anomaly_groups.values():
+        ds.anomalies.detect(ds.df, ds.version, group)
+    for variable in map_variables:
+        ds.map_values(variable)
+    for pathname in pages:
+        render_page(pathname, ds.name)
 
 
+# Servidor de desarrollo (en producción: gunicorn, ver gunicorn.conf.py)
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,79 @@
+// Clientside restyle of the map: swaps the z values (and titles) of the
+// choropleth using the per-year bundle stored in "map-data". In the range
+// modes every country's values over the chosen years are aggregated here
+// (mean, latest value or compound annual growth), without a server round trip
+var MAP_MODES = {
+    mean: "Mean over range",
+    latest: "Latest in range",
+    cagr: "Growth (CAGR, % per year)"
+};
+
+function aggregateYears(byYear, agg, range) {
+    var years = Object.keys(byYear).map(Number).filter(function (y) {
+        return y >= range[0] && y <= range[1];
+    }).sort(function (a, b) { return a - b; });
+    if (!years.length) {
+        return [];
+    }
+
+    return byYear[String(years[0])].map(function (_, i) {
+        var sum = 0, count = 0, first = null, last = null;
+        years.forEach(function (y) {
+            var v = byYear[String(y)][i];
+            if (v === null || v === undefined) {
+                return;
+            }
+            sum += v;
+            count += 1;
+            if (first === null) {
+                first = [y, v];
+            }
+            last = [y, v];
+        });
+        if (!count) {
+            return null;
+        }
+        if (agg === "mean") {
+            return sum / count;
+        }
+        if (agg === "latest") {
+            return last[1];
+        }
+        // cagr: al menos dos años con valores positivos
+        if (last[0] === first[0] || first[1] <= 0 || last[1] <= 0) {
+            return null;
+        }
+        return (Math.pow(last[1] / first[1], 1 / (last[0] - first[0])) - 1) * 100;
+    });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map: {
+        restyle: function (variable, year, agg, range, bundle, figure) {
+            if (!bundle || !figure || !figure.data || !figure.data.length) {
+                return window.dash_clientside.no_update;
+            }
+
+            var byYear = bundle.values[variable] || {};
+            var label = variable.replace(/_/g, " ");
+            var ranged = agg && agg !== "year" && range;
+            var z = ranged ? aggregateYears(byYear, agg, range) : (byYear[String(year)] || []);
+            var period = ranged ? MAP_MODES[agg] + " " + range[0] + "–" + range[1] : year;
+            if (agg === "cagr" && ranged) {
+                label += " – growth % per year";
+            }
+
+            var trace = Object.assign({}, figure.data[0], {
+                z: z,
+                hovertemplate: "<b>%{hovertext}</b><br><br>" + label + "=%{z:,.2f}<extra></extra>"
+            });
+
+            var layout = Object.assign({}, figure.layout);
+            layout.title = Object.assign({}, layout.title, {text: label + " in Europe, " + period});
+            layout.coloraxis = Object.assign({}, layout.coloraxis);
+            layout.coloraxis.colorbar = Object.assign({}, layout.coloraxis.colorbar, {title: {text: label}});
+
+            return Object.assign({}, figure, {data: [trace].concat(figure.data.slice(1)), layout: layout});
+        }
+    }
+});
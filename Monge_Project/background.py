@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:  # sin diskcache los callbacks pesados son síncronos
+    diskcache = None
+    DiskcacheManager = object
+
+# Heavy callbacks (whole-panel anomaly detection, the efficiency rankings) as
+# Dash background callbacks: they run in a separate process while the request
+# thread is free, report their progress, are cancelled when the user leaves
+# the page or changes the inputs again, and their results are kept in a disk
+# cache shared by every user and every gunicorn worker.
+#   BACKGROUND_CALLBACKS=0            run them synchronously
+#   CALLBACK_CACHE_DIR=callback_cache directory of the shared cache
+#   CALLBACK_CACHE_EXPIRE=3600        seconds a result is reused
+ENABLED = os.environ.get("BACKGROUND_CALLBACKS", "1") == "1" and diskcache is not None
+CACHE_DIR = os.environ.get("CALLBACK_CACHE_DIR", "callback_cache")
+CACHE_EXPIRE = int(os.environ.get("CALLBACK_CACHE_EXPIRE", "3600"))
+# Queue of the job timings in the shared cache
+METRICS_PREFIX = "callback-metrics"
+
+
+# DiskcacheManager whose `cache_by` functions get the arguments of the call,
+# so the key holds the version of the panel the call asks for (Dash calls
+# them without arguments, which only allows global values)
+class ArgsCacheManager(DiskcacheManager):
+    def __init__(self, cache, cache_by, expire=None):
+        # una lista vacía activa la caché de resultados en Dash
+        super().__init__(cache, cache_by=[], expire=expire)
+        self.key_by = list(cache_by)
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore, triggered):
+        key = super().build_cache_key(fn, args, cache_args_to_ignore, triggered)
+        values = [by(args) for by in self.key_by]
+        return hashlib.sha256(f"{key}{values}".encode("utf-8")).hexdigest()
+
+
+# Manager for the background callbacks, or None when they are disabled.
+# `cache_by` are functions of the call arguments whose values are part of the
+# result key (the version of the requested panel, so a reload does not serve
+# old results)
+def manager(cache_by=()):
+    if not ENABLED:
+        return None
+    return ArgsCacheManager(diskcache.Cache(CACHE_DIR), cache_by, expire=CACHE_EXPIRE)
+
+
+# The jobs run in their own process: their timings (metrics.timed) are pushed
+# to the shared cache and the web worker that serves /metrics records them
+def ship_timing(manager):
+    def ship(*timing):
+        manager.handle.push(timing, prefix=METRICS_PREFIX, expire=CACHE_EXPIRE)
+    return ship
+
+
+def collect_timings(manager):
+    timings = []
+    while True:
+        _, timing = manager.handle.pull(prefix=METRICS_PREFIX)
+        if timing is None:
+            return timings
+        timings.append(timing)
+
+
+# Progress as (step, total, message) for the progress outputs of a job;
+# without a manager there is nobody to report to
+def no_progress(progress):
+    return None
@@ -0,0 +1,77 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import app
+import serialization
+from anomalies import METRICS
+from trends import METHODS
+
+# Render every figure of the enumerable pages ahead of time and write them as
+# JSON for BakedFigures (one file per callback and input combination). Only
+# the default panel is baked; the other panels are rendered on demand.
+#
+#   python bake_figures.py [--out baked_figures] [--workers N]
+
+
+def combinations():
+    ds = app.datasets.get()
+    years = [int(y) for y in ds.years]
+    default_countries = ds.countries[:5]
+
+    # los gráficos se abren en modo de un año; el rango no cuenta en ese modo
+    # (app.year_mode_inputs), así que va como None, igual que en la clave
+    for year in years:
+        for mode in ["bachelor", "master", "both"]:
+            yield "update_h1_graph", (year, default_countries, mode, "year", None, ds.name)
+        for degree in ["BachelorRate", "MasterRate"]:
+            yield "update_h2_graph", (year, degree, "year", None, ds.name)
+        for show in ["all", "top", "bottom"]:
+            yield "update_efficiency_graphs", (year, show, "year", None, ds.name)
+        for variable in app.map_variables:
+            yield "update_map", (variable, year, ds.name)
+
+    for country in ds.countries:
+        for trend in ["none"] + METHODS:
+            yield "update_h3_graph", (country, trend, ds.name)
+
+    for metric in METRICS:
+        for scope in app.anomaly_groups:
+            yield "detect_anomalies", (metric, scope, ds.name)
+
+
+def render(task):
+    name, args, directory = task
+    # __wrapped__ is the undecorated callback: always render live
+    result = getattr(app, name).__wrapped__(*args)
+    path = os.path.join(directory, app.baked_figures.file_name(name, args))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(serialization.dumps(result))
+    return path
+
+
+def bake(directory=app.BAKED_FIGURES_DIR, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    version_file = os.path.join(directory, "VERSION")
+    if os.path.exists(version_file):
+        os.remove(version_file)
+
+    tasks = [(name, args, directory) for name, args in combinations()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = list(pool.map(render, tasks, chunksize=8))
+
+    # The version is written last so a half-baked directory is never served
+    with open(version_file, "w") as f:
+        f.write(str(app.datasets.get().version))
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render dashboard figures to disk")
+    parser.add_argument("--out", default=app.BAKED_FIGURES_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    options = parser.parse_args()
+
+    written = bake(options.out, options.workers)
+    print(f"Baked {len(written)} figures into {options.out}")
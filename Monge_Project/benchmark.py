@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Benchmark of every figure callback, called directly and through the Flask
+# test client (/_dash-update-component), on the real dataset and on
+# synthetic expansions of it (more countries with jittered values).
+#
+#   python benchmark.py                          # scales 1, 10, 100
+#   python benchmark.py --save-baseline bench_baseline.json
+#   python benchmark.py --compare bench_baseline.json
+#   python benchmark.py --json-engine plotly     # encoder to measure against
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_CSV = os.path.join(PROJECT_DIR, "education_analysis_dataset_clean.csv")
+SCALES = [1, 10, 100]
+METRIC_COLUMNS = ["Expenditure", "EmploymentRate_Females", "EmploymentRate_Males",
+                  "Graduates", "BachelorRate", "MasterRate"]
+
+
+# Copy the panel `scale` times; every copy after the first gets new country
+# names and values jittered by +-10%
+def synthetic_panel(scale, seed=0):
+    base = pd.read_csv(DATA_CSV)
+    rng = np.random.default_rng(seed)
+    parts = [base]
+    for i in range(1, scale):
+        part = base.copy()
+        part["Country"] = part["Country"] + f" {i}"
+        part[METRIC_COLUMNS] = part[METRIC_COLUMNS] * rng.uniform(0.9, 1.1, size=(len(part), len(METRIC_COLUMNS)))
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+# Input combinations per callback (a few years / countries / metrics each)
+def cases(app, per_callback):
+    ds = app.datasets.get()
+    years = [int(y) for y in ds.years]
+    countries = ds.countries
+    name = ds.name
+    span = [years[0], years[-1]]
+
+    def pick(values):
+        step = max(1, len(values) // per_callback)
+        return values[::step][:per_callback]
+
+    return {
+        "update_h1_graph": [(y, countries[:5], "both", "year", span, name) for y in pick(years)],
+        "update_h2_graph": [(y, "BachelorRate", "year", span, name) for y in pick(years)],
+        "update_h3_graph": [(c, "linear", name) for c in pick(countries)],
+        "update_efficiency_graphs": [(y, "all", "year", span, name) for y in pick(years)],
+        "update_map": [("Expenditure", y, name) for y in pick(years)],
+        # más un caso con todas las filas (WebGL y muestreo en paneles grandes)
+        "update_custom_graph": [("Expenditure", "BachelorRate", y, [], "year", span, name) for y in pick(years)]
+                               + [("Expenditure", "BachelorRate", years[0], [], "all", span, name)],
+        "detect_anomalies": [(m, "all", name) for m in pick(["Expenditure", "BachelorRate", "MasterRate",
+                                                              "EmploymentRate_Females", "EmploymentRate_Males"])],
+    }
+
+
+# Callbacks by name
+def callback_entries(app):
+    return {entry["callback"].__name__: (key, entry)
+            for key, entry in app.app.callback_map.items() if entry.get("callback")}
+
+
+def request_body(key, entry, args):
+    outputs = entry["output"] if isinstance(entry["output"], list) else [entry["output"]]
+    outputs = [{"id": o.component_id, "property": o.component_property} for o in outputs]
+    n_inputs = len(entry["inputs"])
+    inputs = [dict(spec, value=value) for spec, value in zip(entry["inputs"], args[:n_inputs])]
+    state = [dict(spec, value=value) for spec, value in zip(entry["state"], args[n_inputs:])]
+    return {
+        "output": key,
+        "outputs": outputs if len(outputs) > 1 else outputs[0],
+        "inputs": inputs,
+        "state": state,
+        "changedPropIds": [f"{inputs[0]['id']}.{inputs[0]['property']}"],
+    }
+
+
+def summarize(latencies, peak_bytes, payload_bytes):
+    ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "peak_mib": peak_bytes / 2 ** 20,
+        "payload_kib": payload_bytes / 1024,
+        "calls": len(latencies),
+    }
+
+
+# Runs inside a subprocess whose working directory holds the synthetic CSV
+def run_scale(repeat, per_callback):
+    sys.path.insert(0, PROJECT_DIR)
+    import app
+    import serialization
+
+    client = app.app.server.test_client()
+    entries = callback_entries(app)
+    results = {}
+
+    for name, arg_list in cases(app, per_callback).items():
+        func = getattr(app, name).__wrapped__   # skip the figure cache
+        results[name] = {}
+
+        # direct call
+        latencies = []
+        for _ in range(repeat):
+            for args in arg_list:
+                start = time.perf_counter()
+                func(*args)
+                latencies.append(time.perf_counter() - start)
+        tracemalloc.start()
+        payload = len(serialization.dumps(func(*arg_list[0])))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name]["direct"] = summarize(latencies, peak, payload)
+
+        # through the Dash endpoint (update_map runs clientside, no endpoint)
+        if name not in entries:
+            continue
+        key, entry = entries[name]
+        latencies = []
+        for _ in range(repeat):
+            for args in arg_list:
+                body = request_body(key, entry, list(args))
+                start = time.perf_counter()
+                response = client.post("/_dash-update-component", json=body)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}{args}: HTTP {response.status_code}")
+        tracemalloc.start()
+        payload = len(client.post("/_dash-update-component",
+                                  json=request_body(key, entry, list(arg_list[0]))).data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name]["http"] = summarize(latencies, peak, payload)
+
+    return results
+
+
+def run_in_subprocess(scale, repeat, per_callback, encoding=None):
+    with tempfile.TemporaryDirectory() as workdir:
+        synthetic_panel(scale).to_csv(os.path.join(workdir, "education_analysis_dataset_clean.csv"), index=False)
+        # callbacks síncronos: se mide el cálculo, no la cola de trabajos
+        env = dict(os.environ, FIGURE_CACHE_SIZE="0", BAKED_FIGURES_DIR=os.path.join(workdir, "no-baked"),
+                   DATA_RELOAD_INTERVAL="0", BACKGROUND_CALLBACKS="0", **(encoding or {}))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-scale",
+             "--repeat", str(repeat), "--per-callback", str(per_callback)],
+            cwd=workdir, env=env, check=True, capture_output=True, text=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_report(report, baseline=None):
+    header = f"{'scale':>5}  {'callback':<26}{'mode':<7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MiB':>10}{'KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for scale, callbacks in report.items():
+        for name, modes in callbacks.items():
+            for mode, r in modes.items():
+                line = (f"{scale:>5}  {name:<26}{mode:<7}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                        f"{r['p99_ms']:>9.1f}{r['peak_mib']:>10.2f}{r['payload_kib']:>9.1f}")
+                base = (baseline or {}).get(scale, {}).get(name, {}).get(mode)
+                if base:
+                    change = (r["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100
+                    line += f"   p50 {change:+.0f}% vs baseline"
+                print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--per-callback", type=int, default=4, help="input combinations per callback")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--json-engine", choices=["orjson", "plotly"], help="encoder of the callback responses")
+    parser.add_argument("--typed-arrays", choices=["0", "1"], help="numeric trace arrays as base64 typed arrays")
+    parser.add_argument("--run-scale", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    encoding = {}
+    if options.json_engine:
+        encoding["FIGURE_JSON_ENGINE"] = options.json_engine
+    if options.typed_arrays:
+        encoding["FIGURE_TYPED_ARRAYS"] = options.typed_arrays
+
+    if options.run_scale:
+        print(json.dumps(run_scale(options.repeat, options.per_callback)))
+        sys.exit(0)
+
+    report = {str(scale): run_in_subprocess(scale, options.repeat, options.per_callback, encoding)
+              for scale in options.scales}
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {options.save_baseline}")
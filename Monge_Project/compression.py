@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+
+from flask import request
+
+from figure_cache import FigureCache
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se usa gzip
+    brotli = None
+
+# Compression for the responses of the Flask server behind Dash (layout,
+# callback outputs, component bundles) and ETags for the GET ones. The ETag
+# is a hash of the uncompressed body plus the encoding, so a client that
+# sends it back in If-None-Match gets a 304 without the body being compressed
+# again. Callback outputs are POST responses: browsers never revalidate them,
+# so they are compressed without hashing.
+
+COMPRESSIBLE = ("application/json", "application/javascript", "text/")
+MIN_SIZE = 500  # bytes; smaller bodies are not worth compressing
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _encode(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+# Register the after_request hook on `server`. Compressed GET bodies are kept
+# in a small LRU keyed by ETag, so a page or bundle sent again is not
+# compressed twice
+def enable_compression(server, level=6, min_size=MIN_SIZE, cache_size=256):
+    compressed = FigureCache(maxsize=cache_size)
+
+    @server.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or "Content-Encoding" in response.headers):
+            return response
+
+        data = response.get_data()
+        encoding = None
+        if len(data) >= min_size and response.mimetype.startswith(COMPRESSIBLE):
+            encoding = _choose_encoding()
+
+        response.vary.add("Accept-Encoding")
+        if request.method not in ("GET", "HEAD"):
+            if encoding:
+                response.set_data(_encode(data, encoding, level))
+                response.headers["Content-Encoding"] = encoding
+            return response
+
+        base_tag = response.get_etag()[0] or hashlib.sha1(data).hexdigest()
+        etag = f"{base_tag}-{encoding}" if encoding else base_tag
+        response.set_etag(etag)
+
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b"")
+            response.headers.pop("Content-Length", None)
+            return response
+
+        if encoding:
+            body = compressed.get(etag)
+            if body is None:
+                body = _encode(data, encoding, level)
+                compressed.set(etag, body)
+            response.set_data(body)
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+    return compressed
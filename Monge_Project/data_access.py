@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+# True when the rows are already in the order of sort_values(columns)
+def is_sorted(frame, columns):
+    if len(frame) < 2:
+        return True
+    tied = np.ones(len(frame) - 1, dtype=bool)
+    for col in columns:
+        values = frame[col]
+        # las categorías se ordenan por su código, como en sort_values
+        values = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+        if (values[1:][tied] < values[:-1][tied]).any():
+            return False
+        tied &= values[1:] == values[:-1]
+    return True
+
+
+# Index a frame by one key column without copying it. Every group is a
+# contiguous block of the rows in key order, and a lookup is just a dict hit
+# plus a slice (no boolean mask scan). A frame already in that order (the
+# panels, sorted by PANEL_ORDER, and the memory-mapped store) is sliced with
+# iloc, which gives views; otherwise `rows` holds the row positions in key
+# order and a lookup takes its block of them
+class PartitionIndex:
+    def __init__(self, frame, key, order=None):
+        sort_cols = [key] + [c for c in (order or []) if c != key]
+        self.key = key
+        self.frame = frame
+        self.rows = None
+        if not is_sorted(frame, sort_cols):
+            # solo se copian las columnas de orden
+            self.rows = frame[sort_cols].reset_index(drop=True).sort_values(sort_cols, kind="stable").index.to_numpy()
+
+        values = frame[key].to_numpy()
+        if self.rows is not None:
+            values = values[self.rows]
+        if len(values):
+            starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+            stops = np.r_[starts[1:], len(values)]
+        else:
+            starts = stops = np.array([], dtype=int)
+
+        self.bounds = {
+            value: (start, stop)
+            for value, start, stop in zip(values[starts].tolist(), starts.tolist(), stops.tolist())
+        }
+
+    def keys(self):
+        return list(self.bounds)
+
+    def _slice(self, start, stop):
+        if self.rows is None:
+            return self.frame.iloc[start:stop]
+        return self.frame.take(self.rows[start:stop])
+
+    def get(self, value):
+        bounds = self.bounds.get(value)
+        if bounds is None:
+            return self.frame.iloc[0:0]
+        return self._slice(*bounds)
+
+    # Rows with the key between `start` and `end` (both included): the groups
+    # are in key order, so this is one slice too
+    def between(self, start, end):
+        inside = [bounds for value, bounds in self.bounds.items() if start <= value <= end]
+        if not inside:
+            return self.frame.iloc[0:0]
+        return self._slice(inside[0][0], inside[-1][1])
+
+
+# Data-access layer used by the callbacks: the panel kept sorted by
+# (Year, Country) and by (Country, Year), so both year and country slices
+# are contiguous
+class PanelIndex:
+    def __init__(self, df):
+        self.df = df
+        self.by_year = PartitionIndex(df, "Year", ["Country"])
+        self.by_country = PartitionIndex(df, "Country", ["Year"])
+
+    def years(self):
+        return self.by_year.keys()
+
+    def countries(self):
+        return self.by_country.keys()
+
+    def year(self, year):
+        return self.by_year.get(year)
+
+    def country(self, country):
+        return self.by_country.get(country)
+
+    def year_span(self, start, end):
+        return self.by_year.between(start, end)
@@ -0,0 +1,129 @@
+import os
+import sys
+
+import pandas as pd
+
+from schema import compact, restore
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sin pyarrow se usa siempre el CSV
+    pa = None
+    feather = None
+
+DATA_CSV = "education_analysis_dataset_clean.csv"
+DATA_STORE = "education_analysis_dataset.feather"
+LONG_STORE = "education_analysis_long.feather"
+
+# Long format shared by the gender-split pages (H2 and H3)
+LONG_COLUMNS = ["Year", "Country", "Expenditure", "BachelorRate", "MasterRate", "Sex", "EmploymentRate"]
+SEX_LABELS = {"EmploymentRate_Females": "Female", "EmploymentRate_Males": "Male"}
+
+
+# Row order of the panels (and of the store): the year slices the pages read
+# are then contiguous blocks of the memory-mapped frame, so indexing it by
+# year (data_access.PartitionIndex) needs no sorted copy
+PANEL_ORDER = ["Year", "Country"]
+
+
+def sort_panel(df):
+    return df.sort_values(PANEL_ORDER, kind="stable", ignore_index=True)
+
+
+# Efficiency (rate divided by expenditure)
+EFFICIENCY_COLUMNS = ["Efficiency_Graduation", "Efficiency_Employment_Females", "Efficiency_Employment_Males"]
+
+
+# float32 columns (schema.compact) are divided with the exact values read
+def add_efficiency_columns(df):
+    def exact(col):
+        return restore(df[col].to_numpy())
+
+    df["Efficiency_Graduation"] = exact("BachelorRate") / exact("Expenditure")
+    df["Efficiency_Employment_Females"] = exact("EmploymentRate_Females") / exact("Expenditure")
+    df["Efficiency_Employment_Males"] = exact("EmploymentRate_Males") / exact("Expenditure")
+    return df
+
+
+# Convert wide format to long format for Employment by Sex
+def melt_employment(df):
+    df_long = pd.melt(
+        df,
+        id_vars=["Year", "Country", "Expenditure", "BachelorRate", "MasterRate"],
+        value_vars=list(SEX_LABELS),
+        var_name="Sex",
+        value_name="EmploymentRate"
+    )
+
+    # Renombrar valores para mejor visualización (categoría: 2 valores)
+    df_long["Sex"] = pd.Categorical(df_long["Sex"].map(SEX_LABELS), categories=list(SEX_LABELS.values()))
+    return df_long
+
+
+# Compact dtypes before deriving, so the long format and the efficiency
+# columns come out compact too (and the store is written that way)
+def derive_from_csv(csv_path=DATA_CSV):
+    df = sort_panel(compact(add_efficiency_columns(compact(pd.read_csv(csv_path)))))
+    return df, sort_panel(melt_employment(df))
+
+
+# Arrow table that keeps NaN as plain float values (no validity bitmap), so
+# numeric columns can be handed to pandas straight from the mapped file
+def _to_arrow(df):
+    arrays = [pa.array(df[col]) if isinstance(df[col].dtype, pd.CategoricalDtype)
+              else pa.array(df[col].to_numpy(), from_pandas=df[col].dtype.kind not in "fiu")
+              for col in df.columns]
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+# Write next to the target and rename: a running app keeps its mapping of the
+# old file and never maps a half-written one
+def _write_atomic(table, path):
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+# Build step: write the analysis dataset and its long format, with the
+# derived columns already computed, as uncompressed Feather files
+def build_store(csv_path=DATA_CSV, store_path=DATA_STORE, long_path=LONG_STORE):
+    if feather is None:
+        raise RuntimeError("pyarrow is required to build the columnar data store")
+    df, df_long = derive_from_csv(csv_path)
+    _write_atomic(_to_arrow(df_long), long_path)
+    _write_atomic(_to_arrow(df), store_path)
+    return store_path, long_path
+
+
+def store_is_fresh(csv_path=DATA_CSV, store_path=DATA_STORE, long_path=LONG_STORE):
+    if feather is None or not (os.path.exists(store_path) and os.path.exists(long_path)):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    csv_mtime = os.path.getmtime(csv_path)
+    return os.path.getmtime(store_path) >= csv_mtime and os.path.getmtime(long_path) >= csv_mtime
+
+
+def _read_mapped(path):
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+# Load (df, df_long, source). The Feather store is memory-mapped when it is
+# present and up to date; otherwise the CSV is read and derived in process
+def load_analysis_data(csv_path=DATA_CSV, store_path=DATA_STORE, long_path=LONG_STORE):
+    if store_is_fresh(csv_path, store_path, long_path):
+        df, df_long = _read_mapped(store_path), _read_mapped(long_path)
+        # store written before the long format gained columns
+        if list(df_long.columns) != LONG_COLUMNS:
+            df_long = sort_panel(melt_employment(df))
+        return df, df_long, store_path
+    df, df_long = derive_from_csv(csv_path)
+    return df, df_long, csv_path
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATA_CSV
+    for path in build_store(csv_path):
+        print(f"Wrote {path}")
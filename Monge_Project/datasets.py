@@ -0,0 +1,304 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import prepare_data
+from aggregates import CountryAggregates
+from anomalies import AnomalyEngine
+from data_access import PanelIndex
+from data_store import (DATA_CSV, DATA_STORE, EFFICIENCY_COLUMNS, LONG_STORE, add_efficiency_columns,
+                        load_analysis_data, melt_employment, sort_panel)
+from rankings import RankingEngine
+from schema import compact, memory_report, restore
+from trends import TrendEngine
+
+log = logging.getLogger(__name__)
+
+# Columns shared by every panel. A panel that does not measure one of the
+# metrics gets it as an empty column, so every page works on every panel
+METRIC_COLUMNS = ["Expenditure", "EmploymentRate_Females", "EmploymentRate_Males",
+                  "Graduates", "BachelorRate", "MasterRate"]
+COLUMNS = ["Country", "Year"] + METRIC_COLUMNS
+
+
+# Missing files count too: a store that appears or disappears changes the data
+def file_version(*paths):
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            parts.append("-")
+            continue
+        parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+    return "/".join(parts)
+
+
+# Shared schema: fixed column order, compact dtypes (schema.compact) and the
+# missing metrics as float32 NaN columns (cheap placeholders). Columns that
+# are already compact are not copied (they may be memory-mapped)
+def conform(df):
+    missing = {col: pd.Series(float("nan"), index=df.index, dtype="float32")
+               for col in METRIC_COLUMNS if col not in df.columns}
+    df = df.assign(**missing)
+    extra = [c for c in df.columns if c not in COLUMNS]
+    return compact(df[COLUMNS + extra])
+
+
+# One loaded panel with everything the pages derive from it. Built once per
+# load; callbacks only read from it. `sources` are the files it was read from
+class Dataset:
+    def __init__(self, name, label, df, df_long, version, sources=()):
+        self.name = name
+        self.label = label
+        self.df = df
+        self.df_long = df_long
+        self.version = f"{name}:{version}"
+        self.sources = tuple(sources)
+        self.schema_report = memory_report(df, df_long)
+
+        # Indice por año y país para que los callbacks no recorran todo el panel
+        self.panel = PanelIndex(df)
+        # Formato largo (Sex categórico) por año y por país, para H2 y H3
+        self.long_panel = PanelIndex(df_long)
+        self.anomalies = AnomalyEngine()
+        self.trends = TrendEngine()
+        # Sumas y conteos por país y año para los KPIs de la portada
+        self.aggregates = CountryAggregates(df, METRIC_COLUMNS + EFFICIENCY_COLUMNS)
+        # Orden de los países por eficiencia en cada año (página Efficiency)
+        self.rankings = RankingEngine(self.panel, EFFICIENCY_COLUMNS)
+
+        # Opciones compartidas por los dropdowns (se calculan una sola vez)
+        self.years = self.panel.years()
+        self.countries = self.panel.countries()
+        self.marks = {int(y): str(y) for y in self.years}
+        self.year_options = [{"label": y, "value": y} for y in self.years]
+        self.country_options = [{"label": c, "value": c} for c in self.countries]
+        self.numeric_options = [
+            {"label": col, "value": col}
+            for col in df.select_dtypes("number").columns if df[col].notna().any()
+        ]
+        self._map_values = None
+
+    # Valores del mapa por variable: tabla año x país (0 se trata como sin dato)
+    def map_values(self, variable):
+        if self._map_values is None:
+            self._map_values = {}
+        table = self._map_values.get(variable)
+        if table is None:
+            table = (self.df.pivot(index="Year", columns="Country", values=variable)
+                     .reindex(index=self.years, columns=self.countries)
+                     .replace(0, float("nan")))
+            # se envía al navegador: valores float32 con sus decimales
+            table = pd.DataFrame(restore(table.to_numpy()), index=table.index, columns=table.columns)
+            self._map_values[variable] = table
+        return table
+
+    def memory_usage(self):
+        return int(self.df.memory_usage(deep=True).sum() + self.df_long.memory_usage(deep=True).sum())
+
+    def is_stale(self):
+        return bool(self.sources) and f"{self.name}:{file_version(*self.sources)}" != self.version
+
+
+def build_dataset(name, label, df, version, sources=()):
+    df = sort_panel(compact(add_efficiency_columns(conform(df))))
+    return Dataset(name, label, df, sort_panel(melt_employment(df)), version, sources)
+
+
+# Registered panels are loaded on first use and kept while they fit in
+# `max_bytes`; the least recently used ones are evicted first (the default
+# panel is never evicted). `generation` changes whenever a panel comes back
+# with different data, so caches keyed on it drop their stale figures
+class DatasetRegistry:
+    def __init__(self, default, max_bytes=512 * 2 ** 20):
+        self.default = default
+        self.max_bytes = max_bytes
+        self._loaders = OrderedDict()
+        self._loaded = OrderedDict()
+        self._versions = {}
+        self.generation = 0
+        self._new_locks()
+        # un proceso hijo (los trabajos en segundo plano) no hereda un lock
+        # que tenía otro hilo del padre en el momento del fork
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._new_locks)
+
+    def _new_locks(self):
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._loading = {}  # name -> Lock, una carga por panel a la vez
+        self._pending = set()
+        self._reloader = None
+
+    def register(self, name, label, loader):
+        self._loaders[name] = (label, loader)
+
+    def names(self):
+        return list(self._loaders)
+
+    def options(self):
+        return [{"label": label, "value": name} for name, (label, _) in self._loaders.items()]
+
+    def resolve(self, name):
+        return name if name in self._loaders else self.default
+
+    # The panel is built outside `_lock`, so requests for other panels (and
+    # /health) do not wait for it; concurrent requests for the same panel wait
+    # on its own lock and get the one the first of them loaded
+    def get(self, name=None):
+        name = self.resolve(name)
+        with self._lock:
+            dataset = self._loaded.get(name)
+            if dataset is not None:
+                self._loaded.move_to_end(name)
+                return dataset
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            with self._lock:
+                dataset = self._loaded.get(name)
+            if dataset is not None:
+                return dataset
+            label, loader = self._loaders[name]
+            dataset = loader(name, label)
+            self._publish(name, dataset)
+            return dataset
+
+    def _publish(self, name, dataset):
+        with self._lock:
+            if self._versions.get(name, dataset.version) != dataset.version:
+                self.generation += 1
+            self._versions[name] = dataset.version
+            self._loaded[name] = dataset
+            self._loaded.move_to_end(name)
+            self._evict(name)
+        report = dataset.schema_report
+        log.info("Loaded dataset %s: %.1f KiB (%.1f KiB saved by the compact schema)",
+                 name, report["after_bytes"] / 1024, report["saved_bytes"] / 1024)
+
+    # Build the panel again from its files while requests keep using the
+    # current one, then swap the reference. A request holds on to the Dataset
+    # it got from get(), so it never mixes old and new data
+    def reload(self, name=None):
+        name = self.resolve(name)
+        label, loader = self._loaders[name]
+        with self._reload_lock:
+            dataset = loader(name, label)
+            self._publish(name, dataset)
+        log.info("Reloaded dataset %s (%s)", name, dataset.version)
+        return dataset
+
+    def stale(self):
+        with self._lock:
+            loaded = list(self._loaded.values())
+        return [ds.name for ds in loaded if ds.is_stale()]
+
+    # Reload the given (or the changed) panels; a panel that fails to build
+    # keeps serving its previous version
+    def reload_all(self, names=None):
+        reloaded = []
+        for name in (self.stale() if names is None else names):
+            try:
+                self.reload(name)
+                reloaded.append(name)
+            except Exception:
+                log.exception("Reloading dataset %s failed, keeping the loaded version", name)
+        return reloaded
+
+    # Reload `names` in a background thread. Requests that arrive while one is
+    # running are merged into a single pending reload; returns what is pending
+    def reload_later(self, names):
+        with self._lock:
+            self._pending.update(names)
+            pending = sorted(self._pending)
+            if self._reloader is None:
+                self._reloader = threading.Thread(target=self._reload_pending, name="dataset-reload-request",
+                                                  daemon=True)
+                self._reloader.start()
+        return pending
+
+    def _reload_pending(self):
+        while True:
+            with self._lock:
+                names = list(self._pending)
+                self._pending.clear()
+                if not names:
+                    self._reloader = None
+                    return
+            self.reload_all(names)
+
+    # `keep` is the panel just published: it is about to be served
+    def _evict(self, keep=None):
+        total = sum(ds.memory_usage() for ds in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.max_bytes:
+                break
+            if name in (self.default, keep):
+                continue
+            total -= self._loaded.pop(name).memory_usage()
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded)
+
+
+# Checks the source files of the loaded panels every `interval` seconds and
+# reloads the ones that changed, in a background thread
+class ReloadWatcher(threading.Thread):
+    def __init__(self, registry, interval=30):
+        super().__init__(name="dataset-reload", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.registry.reload_all()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# Loaders of the panels served by the app. The version is taken before the
+# files are read, so a file replaced during the read is picked up next time
+
+def load_education(name, label):
+    sources = (DATA_CSV, DATA_STORE, LONG_STORE)
+    version = file_version(*sources)
+    df, df_long, _ = load_analysis_data()
+    return Dataset(name, label, conform(df), compact(df_long), version, sources)
+
+
+def unesco_loader(path, indicator, column):
+    def load(name, label):
+        sources = (path, prepare_data.COUNTRY_CODES)
+        version = file_version(*sources)
+        codes = prepare_data.load_country_codes()
+        df = prepare_data.read_unesco_indicator(path, indicator, column, codes)
+        return build_dataset(name, label, df, version, sources)
+    return load
+
+
+def load_expenditure(name, label):
+    sources = (prepare_data.EXPENDITURE_CLEAN,)
+    version = file_version(*sources)
+    df = prepare_data.read_expenditure(prepare_data.EXPENDITURE_CLEAN)
+    return build_dataset(name, label, df, version, sources)
+
+
+def default_registry():
+    registry = DatasetRegistry(
+        "education",
+        max_bytes=int(os.environ.get("DATASET_MEMORY_MB", "512")) * 2 ** 20
+    )
+    registry.register("education", "Education & Employment (Eurostat + UNESCO)", load_education)
+    registry.register("bachelor", "Completed Bachelor's (UNESCO)",
+                      unesco_loader(prepare_data.BACHELOR_RAW, prepare_data.BACHELOR_INDICATOR, "BachelorRate"))
+    registry.register("master", "Completed Master's (UNESCO)",
+                      unesco_loader(prepare_data.MASTER_RAW, prepare_data.MASTER_INDICATOR, "MasterRate"))
+    registry.register("expenditure", "Education Expenditure (Eurostat)", load_expenditure)
+    return registry
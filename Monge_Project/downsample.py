@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+# Large scatter plots (all years of a big panel): above WEBGL_THRESHOLD points
+# the traces are drawn with WebGL, and above POINT_BUDGET the rows are
+# thinned on the server before the figure is serialized.
+#   SCATTER_POINT_BUDGET=5000     points sent per figure (0 = no limit)
+#   SCATTER_WEBGL_THRESHOLD=1000  points from which the traces use WebGL
+POINT_BUDGET = int(os.environ.get("SCATTER_POINT_BUDGET", "5000"))
+WEBGL_THRESHOLD = int(os.environ.get("SCATTER_WEBGL_THRESHOLD", "1000"))
+GRID_BINS = 64  # cells per axis (fewer when the budget is small)
+# More groups than this are drawn as a single trace: plotly builds one trace
+# (and one legend entry) per colour group, which dominates the render time
+MAX_COLOR_GROUPS = 50
+
+
+def render_mode(n_points, threshold=None):
+    threshold = WEBGL_THRESHOLD if threshold is None else threshold
+    return "webgl" if n_points > threshold else "svg"
+
+
+# Column to colour by, or None when it has too many groups for one trace each
+def color_column(df, column):
+    return column if df[column].nunique() <= MAX_COLOR_GROUPS else None
+
+
+# Cell of every value on a grid of `bins` equal steps between min and max
+def _bin(values, bins):
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=np.intp)
+    return np.minimum(((values - low) / (high - low) * bins).astype(np.intp), bins - 1)
+
+
+# Density-preserving sample of the rows of `df` for an (x, y) scatter: the
+# plane is cut into a grid and every occupied cell keeps one row plus a share
+# of the rest of the budget proportional to its count, so dense areas stay
+# dense and isolated points (the outliers) are never dropped. Rows keep their
+# order and the same input always gives the same sample
+def grid_sample(df, x, y, budget=None, bins=GRID_BINS, seed=0):
+    budget = POINT_BUDGET if budget is None else budget
+    if not budget or len(df) <= budget:
+        return df
+    # filas sin x o y no se dibujan de todas formas
+    df = df.dropna(subset=[x, y])
+    if len(df) <= budget:
+        return df
+
+    bins = max(1, min(bins, int(np.sqrt(budget))))
+    cell = _bin(df[x].to_numpy(dtype=float), bins) * bins + _bin(df[y].to_numpy(dtype=float), bins)
+    counts = np.bincount(cell, minlength=bins * bins)
+    occupied = int((counts > 0).sum())
+    quota = np.where(counts > 0, 1 + counts * (budget - occupied) // len(df), 0)
+
+    # orden aleatorio fijo; dentro de cada celda se quedan las primeras `quota`
+    shuffled = np.random.default_rng(seed).permutation(len(df))
+    by_cell = shuffled[np.argsort(cell[shuffled], kind="stable")]
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    rank = np.arange(len(df)) - starts[cell[by_cell]]
+    keep = np.sort(by_cell[rank < quota[cell[by_cell]]])
+    return df.iloc[keep]
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+import serialization
+from metrics import phase
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos, solo entre hilos
+    fcntl = None
+
+
+# Turn callback inputs into a hashable key (lists from multi dropdowns become
+# tuples, numpy numbers become plain Python numbers)
+def normalize_inputs(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_inputs(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_inputs(v)) for k, v in value.items()))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# LRU cache of serialized figures. Entries expire after `ttl` seconds and the
+# whole cache is dropped when `version()` changes (the dataset was reloaded)
+class FigureCache:
+    def __init__(self, maxsize=256, ttl=None, version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = version() if version else None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        current = self.version()
+        if current != self._version:
+            self._entries.clear()
+            self._version = current
+
+    def get(self, key):
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def current_version(self):
+        return self.version() if self.version else None
+
+    # `version` is the one seen before rendering: a figure rendered while the
+    # dataset was being swapped is not stored under the new version
+    def set(self, key, payload, version=None):
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (payload, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Figures rendered ahead of time by bake_figures.py, one JSON file per
+# callback and input combination. They are only served while the version
+# written next to them matches the loaded dataset
+class BakedFigures:
+    def __init__(self, directory, version=None):
+        self.directory = directory
+        self.version = version
+
+    @staticmethod
+    def file_name(name, args):
+        digest = hashlib.sha1(json.dumps(normalize_inputs(args)).encode("utf-8")).hexdigest()
+        return os.path.join(name, f"{digest}.json")
+
+    def version_file(self):
+        return os.path.join(self.directory, "VERSION")
+
+    def is_current(self):
+        try:
+            with open(self.version_file()) as f:
+                baked_version = f.read().strip()
+        except OSError:
+            return False
+        return self.version is None or baked_version == str(self.version())
+
+    def get(self, name, args):
+        if not self.is_current():
+            return None
+        try:
+            with open(os.path.join(self.directory, self.file_name(name, args)), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None
+        self.error = None
+
+
+# One computation per key at a time ("single flight"): calls that arrive
+# while the same key is being computed wait for it and share its payload
+# instead of computing it again. Threads of a process wait on an event; with
+# a `directory` (and fcntl) the processes of the host also wait for each
+# other on a lock file per key; a waiting process leaves a marker next to it
+# and only then the payload is handed over in a file. `version(key)` (the
+# version of the data the call reads) is part of the key, so results of old
+# data are never shared. A waiter gives up after `timeout` seconds and
+# computes on its own.
+class SingleFlight:
+    def __init__(self, directory=None, version=None, timeout=30.0, max_age=300.0, prune_every=100):
+        self.directory = directory if fcntl is not None else None
+        self.version = version
+        self.timeout = timeout
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._computations = 0
+        self.computed = 0
+        self.shared = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def do(self, key, compute):
+        key = (key, normalize_inputs(self.version(key)) if self.version else None)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                return compute()
+            if call.error is not None:
+                raise call.error
+            with self._lock:
+                self.shared += 1
+            return call.payload
+
+        try:
+            call.payload = self._across_processes(key, compute)
+            return call.payload
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _across_processes(self, key, compute):
+        if self.directory is None:
+            return self._compute(compute)
+
+        digest = hashlib.sha1(json.dumps(key, default=str).encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, digest)
+        with open(f"{path}.lock", "a") as lock_file:
+            started = time.time()
+            waited = not self._try_lock(lock_file)
+            if waited:
+                # quien tiene el lock escribe el resultado solo si alguien espera
+                open(f"{path}.wait", "a").close()
+            locked = not waited or self._wait_lock(lock_file)
+            try:
+                # solo vale un resultado escrito mientras se esperaba (no es una caché)
+                if waited:
+                    payload = self._read_result(f"{path}.json", started)
+                    if payload is not None:
+                        with self._lock:
+                            self.shared += 1
+                        return payload
+                if locked:
+                    # un lock reciente no se borra al podar
+                    os.utime(f"{path}.lock")
+                payload = self._compute(compute)
+                if self._take_waiters(f"{path}.wait"):
+                    self._write_result(f"{path}.json", payload)
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._maybe_prune()
+        return payload
+
+    def _compute(self, compute):
+        payload = compute()
+        with self._lock:
+            self.computed += 1
+        return payload
+
+    # Remove the marker of the processes waiting for this key; True if any
+    @staticmethod
+    def _take_waiters(marker):
+        try:
+            os.remove(marker)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _wait_lock(self, lock_file):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self._try_lock(lock_file):
+                return True
+            time.sleep(0.01)
+        return False
+
+    # The holder may have written the result just before we started waiting
+    @staticmethod
+    def _read_result(path, started):
+        try:
+            if os.stat(path).st_mtime < started - 1.0:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    # Atomic write (the lock is held)
+    @staticmethod
+    def _write_result(path, payload):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+
+    # Every `prune_every` computations, remove the files of keys not used for
+    # `max_age` seconds. A lock file is removed only while we hold it, so a
+    # process that is using it right now keeps it
+    def _maybe_prune(self):
+        with self._lock:
+            self._computations += 1
+            if self._computations % self.prune_every:
+                return
+        cutoff = time.time() - self.max_age
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                if not entry.name.endswith(".lock"):
+                    os.remove(entry.path)
+                    continue
+                with open(entry.path, "a") as lock_file:
+                    if self._try_lock(lock_file):
+                        os.remove(entry.path)
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except OSError:
+                pass
+
+
+# Decorator for figure callbacks: repeated inputs are answered from the cache
+# (or from a baked figure on disk) without touching pandas or plotly express.
+# With a SingleFlight, identical calls in flight at the same time share one
+# computation. `normalize(*args)` returns the arguments that matter for the
+# figure; the key is built from them and the callback is called with them,
+# so inputs the figure ignores do not make new entries
+def cached_figure(cache, baked=None, flight=None, normalize=None):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            if normalize is not None:
+                args = normalize(*args)
+            key = (func.__name__, normalize_inputs(args))
+            payload = cache.get(key)
+            if payload is None and baked is not None:
+                payload = baked.get(func.__name__, args)
+                if payload is not None:
+                    cache.set(key, payload)
+            if payload is not None:
+                return serialization.loads(payload)
+
+            # la versión vista antes de calcular: lo calculado (aquí o en otra
+            # petición) durante un cambio de panel no se guarda con la nueva
+            version = cache.current_version()
+            rendered = []
+
+            def render():
+                with phase("render"):
+                    result = func(*args)
+                with phase("serialize"):
+                    payload = serialization.dumps(result)
+                cache.set(key, payload, version)
+                rendered.append(result)
+                return payload
+
+            payload = render() if flight is None else flight.do(key, render)
+            if rendered:
+                return rendered[0]
+            # calculado por otra petición (otro hilo u otro worker)
+            cache.set(key, payload, version)
+            return serialization.loads(payload)
+        return wrapper
+    return decorator
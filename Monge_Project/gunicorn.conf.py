@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py   (from Monge_Project)
+
+wsgi_app = "wsgi:server"
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8050')}")
+
+# Load the data once in the master; workers are forked with it already in memory
+preload_app = True
+
+# Rendering is CPU bound (pandas / plotly hold the GIL): one process per
+# usable core does the work, a couple of threads each cover requests waiting
+# on I/O (static assets, compressed payloads from the cache)
+cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", cores))
+threads = int(os.environ.get("GUNICORN_THREADS", "2"))
+worker_class = "gthread"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then; they are forked again from the preloaded master
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
+
+
+# The master has loaded the app (preload_app) and no worker is running yet:
+# the metrics of a previous run are dropped, a new server starts from zero
+def on_starting(server):
+    import metrics
+    metrics.clear_snapshots(os.environ.get("METRICS_DIR"))
+
+
+def post_fork(server, worker):
+    import app as dashboard
+    dashboard.start_reload_watcher()
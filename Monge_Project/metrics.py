@@ -0,0 +1,293 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds (Prometheus style, +Inf is implicit)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Distinct input combinations tracked per callback; the rest go to "other"
+MAX_INPUT_COMBINATIONS = 100
+
+# Seconds between the snapshots a process writes to the shared directory
+FLUSH_INTERVAL = 1.0
+
+_current = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    @classmethod
+    def restore(cls, counts, total, count):
+        histogram = cls()
+        histogram.counts = list(counts)
+        histogram.sum = total
+        histogram.count = count
+        return histogram
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += seconds
+        self.count += 1
+
+    # Cumulative (le) counts, as expected by the Prometheus text format
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            yield bound, total
+
+
+# Time one part of a callback ("pandas", "render", "serialize"). Outside an
+# instrumented callback it does nothing
+@contextmanager
+def phase(name):
+    phases = getattr(_current, "phases", None)
+    # a phase nested in the same phase (a figure rendered inside a layout)
+    # is already counted by the outer one
+    if phases is None or name in _current.active:
+        yield
+        return
+
+    _current.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+        _current.active.discard(name)
+
+
+# Histograms of the callbacks of this process. With a `directory` every
+# process (each gunicorn worker) writes a snapshot of its own to it, at most
+# every FLUSH_INTERVAL seconds, and /metrics adds up all the snapshots, so
+# the answer does not depend on which worker the scrape reaches. Snapshots
+# of workers that exited stay, so the counters never go back
+class CallbackMetrics:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # un worker recién creado no arrastra lo que midió el master
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.total = {}     # callback -> Histogram
+        self.phases = {}    # (callback, phase) -> Histogram
+        self.inputs = {}    # (callback, inputs) -> Histogram
+        self.errors = {}    # callback -> count
+        self._dirty = False
+        self._flusher = None
+        self._flush_lock = threading.Lock()
+        # pid más un sufijo: un pid reutilizado no pisa la instantánea de otro
+        self._snapshot = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram()
+        return histogram
+
+    def _inputs_label(self, name, args):
+        label = json.dumps(args, ensure_ascii=False, default=str)
+        if (name, label) in self.inputs:
+            return label
+        tracked = sum(1 for callback, _ in self.inputs if callback == name)
+        return label if tracked < MAX_INPUT_COMBINATIONS else "other"
+
+    def record(self, name, args, seconds, phases, failed=False):
+        # "render" is the whole figure function; what is not pandas is plotly
+        if "render" in phases:
+            phases = dict(phases)
+            phases["plotly"] = max(phases.pop("render") - phases.get("pandas", 0.0), 0.0)
+
+        with self.lock:
+            self._histogram(self.total, name).observe(seconds)
+            for phase_name, phase_seconds in phases.items():
+                self._histogram(self.phases, (name, phase_name)).observe(phase_seconds)
+            self._histogram(self.inputs, (name, self._inputs_label(name, args))).observe(seconds)
+            if failed:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            self._dirty = True
+            if self.directory and self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def _tables(self):
+        return {
+            "total": [[[name], h.counts, h.sum, h.count] for name, h in self.total.items()],
+            "phases": [[list(key), h.counts, h.sum, h.count] for key, h in self.phases.items()],
+            "inputs": [[list(key), h.counts, h.sum, h.count] for key, h in self.inputs.items()],
+            "errors": [[name, count] for name, count in self.errors.items()],
+        }
+
+    # Write this process's snapshot (atomically) if it recorded something new
+    def flush(self):
+        if not self.directory:
+            return
+        with self._flush_lock:
+            with self.lock:
+                if not self._dirty:
+                    return
+                tables = self._tables()
+                self._dirty = False
+            path = os.path.join(self.directory, self._snapshot)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(tables, f)
+            os.replace(f"{path}.tmp", path)
+
+    # Snapshots of every process that wrote one (only this one without a directory)
+    def _snapshots(self):
+        if not self.directory:
+            with self.lock:
+                return [self._tables()]
+        self.flush()
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        histograms = {"total": {}, "phases": {}, "inputs": {}}
+        errors = {}
+        for tables in self._snapshots():
+            for table, merged in histograms.items():
+                for key, counts, total, count in tables[table]:
+                    histogram = Histogram.restore(counts, total, count)
+                    if tuple(key) in merged:
+                        merged[tuple(key)].merge(histogram)
+                    else:
+                        merged[tuple(key)] = histogram
+            for name, count in tables["errors"]:
+                errors[name] = errors.get(name, 0) + count
+
+        lines = []
+        _render_histograms(lines, "dash_callback_duration_seconds",
+                           "Total time per Dash callback, serialization included",
+                           histograms["total"], ("callback",))
+        _render_histograms(lines, "dash_callback_phase_seconds",
+                           "Time per callback phase (pandas, plotly, serialize)",
+                           histograms["phases"], ("callback", "phase"))
+        _render_histograms(lines, "dash_callback_inputs_duration_seconds",
+                           "Total time per callback and input combination",
+                           histograms["inputs"], ("callback", "inputs"))
+        lines.append("# HELP dash_callback_errors_total Callbacks that raised an exception")
+        lines.append("# TYPE dash_callback_errors_total counter")
+        for name, count in sorted(errors.items()):
+            lines.append(f'dash_callback_errors_total{{callback="{_escape(name)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+# Remove the snapshots of a previous run of the server
+def clear_snapshots(directory):
+    if not directory or not os.path.isdir(directory):
+        return
+    for entry in os.scandir(directory):
+        if entry.name.endswith((".json", ".tmp")):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_histograms(lines, metric, help_text, histograms, label_names):
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for key, histogram in sorted(histograms.items()):
+        labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(label_names, key))
+        for bound, count in histogram.cumulative():
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+
+# Time `func` and its phases as callback `name`; every call ends with
+# record(name, args, seconds, phases, failed) (CallbackMetrics.record, or a
+# function that hands the timing to another process)
+def timed(func, name, record):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        _current.phases = {}
+        _current.active = set()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            record(name, args, seconds, _current.phases, failed)
+            _current.phases = None
+    return wrapper
+
+
+# Wrap every server-side callback registered on `app` and serve the
+# histograms on `path` of the Flask server. Background callbacks are left
+# alone (here they would only time the dispatch and the polling): their jobs
+# time themselves and `collect()` returns those timings when /metrics is read
+def instrument(app, registry=None, path="/metrics", collect=None):
+    registry = registry or CallbackMetrics()
+
+    for entry in app.callback_map.values():
+        callback = entry.get("callback")
+        if callback is None:  # clientside callbacks run in the browser
+            continue
+        if entry.get("background"):
+            continue
+        name = getattr(callback, "__name__", "callback")
+        entry["callback"] = timed(callback, name, registry.record)
+
+    # Dash serializes the callback output with dash._callback.to_json
+    from dash import _callback
+    to_json = _callback.to_json
+
+    def timed_to_json(obj):
+        with phase("serialize"):
+            return to_json(obj)
+
+    _callback.to_json = timed_to_json
+
+    @app.server.route(path)
+    def metrics_endpoint():
+        for timing in (collect() if collect else ()):
+            registry.record(*timing)
+        return app.server.response_class(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    return registry
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+
+# Raw UNESCO exports (indicatorId,geoUnit,year,value,qualifier,magnitude)
+BACHELOR_RAW = os.path.join("completed Bachelor's", "data.csv")
+MASTER_RAW = os.path.join("completed Master's", "data.csv")
+BACHELOR_INDICATOR = "EA.6T8.AG25T99"
+MASTER_INDICATOR = "EA.7T8.AG25T99"
+
+# ISO3 geoUnit -> country name used by the app
+COUNTRY_CODES = "country_codes.csv"
+
+# Eurostat expenditure (Country, Year, Expenditure; several rows per country/year)
+EXPENDITURE_CLEAN = "education_expenditure_clean.csv"
+
+# Eurostat employment/graduates (Country, Year, EmploymentRate_Females,
+# EmploymentRate_Males, Graduates). This export is not part of the repo; when
+# it is missing a snapshot of those columns (taken from the analysis dataset
+# and never written by the pipeline) is used instead
+EMPLOYMENT_CLEAN = "employment_rate_clean.csv"
+EMPLOYMENT_SNAPSHOT = "employment_snapshot.csv"
+
+BACHELOR_CLEAN = "bachelor_attainment_clean.csv"
+OUTPUT = "education_analysis_dataset_clean.csv"
+
+CACHE_DIR = ".prepare_cache"
+MANIFEST = os.path.join(CACHE_DIR, "manifest.json")
+CHUNK_SIZE = 200_000
+
+OUTPUT_COLUMNS = ["Country", "Year", "Expenditure", "EmploymentRate_Females",
+                  "EmploymentRate_Males", "Graduates", "BachelorRate", "MasterRate"]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_country_codes(path=COUNTRY_CODES):
+    codes = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(codes["geoUnit"], codes["Country"]))
+
+
+# Stream one UNESCO export in chunks, keep a single indicator and map the
+# geoUnit codes to country names (regional aggregates have no name and are dropped)
+def read_unesco_indicator(path, indicator, value_name, country_codes):
+    parts = []
+    reader = pd.read_csv(
+        path,
+        usecols=["indicatorId", "geoUnit", "year", "value"],
+        dtype={"indicatorId": str, "geoUnit": str, "year": "int64", "value": "float64"},
+        chunksize=CHUNK_SIZE
+    )
+    for chunk in reader:
+        chunk = chunk[chunk["indicatorId"] == indicator]
+        country = chunk["geoUnit"].map(country_codes)
+        parts.append(pd.DataFrame({
+            "Country": country,
+            "Year": chunk["year"],
+            value_name: chunk["value"]
+        })[country.notna()])
+
+    if not parts:
+        return pd.DataFrame(columns=["Country", "Year", value_name])
+    return pd.concat(parts, ignore_index=True)
+
+
+# Expenditure has several rows per country and year; the panel uses their mean
+def read_expenditure(path):
+    parts = []
+    for chunk in pd.read_csv(path, usecols=["Country", "Year", "Expenditure"], chunksize=CHUNK_SIZE):
+        parts.append(chunk.groupby(["Country", "Year"])["Expenditure"].agg(["sum", "count"]))
+    totals = pd.concat(parts).groupby(level=[0, 1]).sum()
+    return (totals["sum"] / totals["count"]).rename("Expenditure").reset_index()
+
+
+def read_employment(path):
+    return pd.read_csv(path, usecols=["Country", "Year", "EmploymentRate_Females",
+                                      "EmploymentRate_Males", "Graduates"])
+
+
+def _load_manifest():
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(manifest):
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+# Process one source only if its content hash (or the country codes it
+# depends on) changed since the last run; otherwise reuse the cached frame
+def _cached_step(name, path, build, manifest, depends=()):
+    key = {"source": file_hash(path), **{dep: manifest.get(dep, {}).get("source") for dep in depends}}
+    cached = os.path.join(CACHE_DIR, f"{name}.pkl")
+    if manifest.get(name) == key and os.path.exists(cached):
+        return pd.read_pickle(cached), False
+
+    frame = build(path)
+    frame.to_pickle(cached)
+    manifest[name] = key
+    return frame, True
+
+
+def prepare(output=OUTPUT, employment_path=EMPLOYMENT_CLEAN):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest = _load_manifest()
+
+    manifest["country_codes"] = {"source": file_hash(COUNTRY_CODES)}
+    country_codes = load_country_codes()
+
+    if not os.path.exists(employment_path):
+        employment_path = EMPLOYMENT_SNAPSHOT
+
+    bachelor, bachelor_changed = _cached_step(
+        "bachelor", BACHELOR_RAW,
+        lambda p: read_unesco_indicator(p, BACHELOR_INDICATOR, "BachelorRate", country_codes),
+        manifest, depends=("country_codes",))
+    master, _ = _cached_step(
+        "master", MASTER_RAW,
+        lambda p: read_unesco_indicator(p, MASTER_INDICATOR, "MasterRate", country_codes),
+        manifest, depends=("country_codes",))
+    expenditure, _ = _cached_step("expenditure", EXPENDITURE_CLEAN, read_expenditure, manifest)
+    employment, _ = _cached_step("employment", employment_path, read_employment, manifest)
+
+    if bachelor_changed or not os.path.exists(BACHELOR_CLEAN):
+        bachelor.to_csv(BACHELOR_CLEAN, index=False, lineterminator="\r\n")
+
+    dataset = (
+        expenditure
+        .merge(employment, on=["Country", "Year"])
+        .merge(bachelor, on=["Country", "Year"])
+        .merge(master, on=["Country", "Year"])
+        .sort_values(["Country", "Year"])
+    )[OUTPUT_COLUMNS]
+
+    dataset.to_csv(output, index=False, lineterminator="\r\n")
+    _save_manifest(manifest)
+    return dataset
+
+
+if __name__ == "__main__":
+    result = prepare(*sys.argv[1:2])
+    print(f"Wrote {len(result)} rows to {sys.argv[1] if len(sys.argv) > 1 else OUTPUT}")
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+
+# Rows of `frame` best first by `metric`, rows without a value last (ties
+# keep the frame order)
+def sort_frame(frame, metric):
+    values = frame[metric].to_numpy(dtype=float)
+    missing = np.isnan(values)
+    return frame.take(np.lexsort((-np.where(missing, 0.0, values), missing)))
+
+
+# The k best / worst (worst first) rows of a frame sorted by sort_frame,
+# leaving out the rows without a value
+def top_rows(ranked, metric, k=10):
+    return ranked.iloc[:min(k, int(ranked[metric].notna().sum()))]
+
+
+def bottom_rows(ranked, metric, k=10):
+    count = int(ranked[metric].notna().sum())
+    return ranked.iloc[max(count - k, 0):count].iloc[::-1]
+
+
+# Country rankings of every metric in every year, computed once per panel:
+# one sort over a (year x country) matrix per metric gives the order of each
+# year (best first, countries without a value last) and the rank of every
+# country, so the bar charts, top-k lists and rank trajectories are lookups
+class RankingEngine:
+    def __init__(self, panel, metrics):
+        self.panel = panel
+        self.metrics = list(metrics)
+        self.years = panel.years()
+        self.countries = panel.countries()
+
+        # filas del panel ordenado por (Year, Country) en una tabla año x país
+        frame = panel.by_year.frame
+        y = np.searchsorted(self.years, frame["Year"].to_numpy())
+        c = pd.Categorical(frame["Country"], categories=self.countries).codes
+        self._rows = np.full((len(self.years), len(self.countries)), -1, dtype=np.intp)
+        self._rows[y, c] = np.arange(len(frame))
+        present = self._rows >= 0
+
+        self._order = {}
+        self._present = present.sum(axis=1)
+        self._ranks = {}
+        for metric in self.metrics:
+            values = np.full(self._rows.shape, np.nan)
+            values[y, c] = frame[metric].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            # descendente; empates en el orden del panel, sin dato al final
+            # y los países sin fila en ese año fuera
+            order = np.lexsort((-np.where(missing, 0.0, values), missing, ~present), axis=1)
+
+            ranks = np.zeros(self._rows.shape, dtype=np.int32)
+            np.put_along_axis(ranks, order, np.arange(1, len(self.countries) + 1), axis=1)
+            self._order[metric] = order
+            self._ranks[metric] = np.where(missing, 0, ranks)
+
+    def _year_pos(self, year):
+        pos = int(np.searchsorted(self.years, year))
+        if pos == len(self.years) or self.years[pos] != year:
+            return None
+        return pos
+
+    # Rows of `year` sorted by `metric` (best first, rows without a value
+    # last), the same frame as sort_frame(panel.year(year), metric)
+    def sorted_view(self, metric, year):
+        pos = self._year_pos(year)
+        if pos is None:
+            return self.panel.year(year)
+        rows = self._rows[pos, self._order[metric][pos, :self._present[pos]]]
+        return self.panel.by_year.frame.take(rows)
+
+    def top(self, metric, year, k=10):
+        return top_rows(self.sorted_view(metric, year), metric, k)
+
+    def bottom(self, metric, year, k=10):
+        return bottom_rows(self.sorted_view(metric, year), metric, k)
+
+    # Rank of every country in `year` (NaN = no value that year)
+    def ranks(self, metric, year):
+        pos = self._year_pos(year)
+        if pos is None:
+            return pd.Series(np.nan, index=pd.Index(self.countries, name="Country"), name=metric)
+        return pd.Series(self._ranks[metric][pos], index=pd.Index(self.countries, name="Country"),
+                         name=metric).replace(0, np.nan)
+
+    # Rank over the years as a table year x country (NaN = no value)
+    def trajectory(self, metric, countries=None):
+        table = pd.DataFrame(self._ranks[metric], index=pd.Index(self.years, name="Year"),
+                             columns=pd.Index(self.countries, name="Country")).replace(0, np.nan)
+        return table if countries is None else table.reindex(columns=countries)
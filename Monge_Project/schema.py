@@ -0,0 +1,86 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Compact in-memory schema shared by every panel: Country as a categorical,
+# Year as a small int and the metrics as float32 when that loses nothing.
+# melt, slices and pivots keep these dtypes, so derived frames stay compact.
+
+KEY_DTYPES = {"Country": "category", "Year": "int16"}
+
+
+# True when storing `values` as float32 loses nothing: the shortest decimal
+# text of every float32 value (what restore() gives back) parses to exactly
+# the float64 value read. That holds for values written with up to ~7
+# significant digits (74.9, whole numbers up to 2**24); a column with a
+# value like 5908.966666666667 stays float64
+def float32_safe(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return True
+    if not np.isfinite(values).all() or np.abs(values).max() > np.finfo(np.float32).max:
+        return False
+    return bool((restore(values.astype(np.float32)) == values).all())
+
+
+def compact(df):
+    changes = {}
+    for col, dtype in KEY_DTYPES.items():
+        if col in df.columns and df[col].dtype != dtype:
+            changes[col] = df[col].astype(dtype)
+    for col in df.select_dtypes("float64").columns:
+        if float32_safe(df[col].to_numpy()):
+            changes[col] = df[col].astype("float32")
+    # assign only replaces the changed columns (the others may be memory-mapped)
+    return df.assign(**changes) if changes else df
+
+
+# The dtype each compact dtype replaces (what pandas would load by default)
+def _wide(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.astype(object)
+    if column.dtype.kind == "f":
+        return column.astype("float64")
+    if column.dtype.kind in "iu":
+        return column.astype("int64")
+    return column
+
+
+# Bytes the compact frames take and the bytes they would take with the
+# default dtypes (object strings, int64, float64)
+def memory_report(*frames):
+    report = {"before_bytes": 0, "after_bytes": 0, "columns": {}}
+    for df in frames:
+        for col in df.columns:
+            wide = _wide(df[col])
+            report["before_bytes"] += int(wide.memory_usage(deep=True, index=False))
+            report["after_bytes"] += int(df[col].memory_usage(deep=True, index=False))
+            if wide.dtype != df[col].dtype:
+                report["columns"][col] = (str(wide.dtype), str(df[col].dtype))
+    report["saved_bytes"] = report["before_bytes"] - report["after_bytes"]
+    return report
+
+
+# float32 values printed back as the decimals they were read from
+# (74.9 instead of 74.9000015258789), for values shown as text. compact()
+# only narrows columns for which this gives back exactly the values read
+def restore(values):
+    if getattr(values, "dtype", None) == np.float32:
+        return values.astype(str).astype("float64")
+    return values
+
+
+def print_report(report):
+    for col, (old, new) in report["columns"].items():
+        print(f"  {col:<32}{old:>10} -> {new}")
+    saved = report["saved_bytes"] / max(report["before_bytes"], 1) * 100
+    print(f"  {report['before_bytes'] / 1024:.1f} KiB -> {report['after_bytes'] / 1024:.1f} KiB "
+          f"({saved:.0f}% saved)")
+
+
+if __name__ == "__main__":
+    from data_store import DATA_CSV, derive_from_csv
+
+    print_report(memory_report(*derive_from_csv(sys.argv[1] if len(sys.argv) > 1 else DATA_CSV)))
@@ -0,0 +1,140 @@
+import base64
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from _plotly_utils.utils import is_skipped_key, plotlyjsShortTypes
+from plotly.basedatatypes import BaseFigure
+from plotly.io.json import to_json_plotly
+
+try:
+    import orjson
+except ImportError:  # sin orjson se usa el codificador de plotly
+    orjson = None
+
+# JSON of the callback responses and of the cached figures.
+#   FIGURE_JSON_ENGINE=orjson  figures and NumPy arrays encoded by orjson
+#                              directly (default when orjson is installed)
+#   FIGURE_JSON_ENGINE=plotly  the encoder Dash uses by default
+#   FIGURE_TYPED_ARRAYS=1      numeric trace arrays as base64 typed arrays
+#                              instead of JSON lists (orjson engine)
+JSON_ENGINE = os.environ.get("FIGURE_JSON_ENGINE", "orjson" if orjson else "plotly")
+TYPED_ARRAYS = os.environ.get("FIGURE_TYPED_ARRAYS", "0") == "1"
+
+# plotly.js has no 64-bit integer arrays: they go as the smallest that fits
+INT_DOWNCASTS = [np.int8, np.int16, np.int32]
+
+
+# A numeric array as a plotly.js typed array ({"dtype": "f4", "bdata": ...});
+# anything else is returned as is
+def typed_array(values):
+    if values.dtype.kind not in "fiu" or values.size == 0:
+        return values
+    if values.dtype.itemsize == 8 and values.dtype.kind in "iu":
+        low, high = values.min(), values.max()
+        fits = [t for t in INT_DOWNCASTS if np.iinfo(t).min <= low and high <= np.iinfo(t).max]
+        if not fits:
+            return values
+        values = values.astype(fits[0])
+    code = plotlyjsShortTypes.get(str(values.dtype))
+    if code is None:
+        return values
+    spec = {"dtype": code, "bdata": base64.b64encode(np.ascontiguousarray(values)).decode("ascii")}
+    if values.ndim > 1:
+        spec["shape"] = ", ".join(str(n) for n in values.shape)
+    return spec
+
+
+# Numeric arrays of the figure as typed arrays. Copies the containers on the
+# way, the figure itself is not modified
+def _typed(value):
+    if isinstance(value, dict):
+        return {key: item if is_skipped_key(key) else _typed(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_typed(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return typed_array(value)
+    return value
+
+
+# The figure as plain data. Reads the figure's own dicts instead of
+# to_plotly_json(), which deep-copies them first
+def figure_dict(fig, typed_arrays=TYPED_ARRAYS):
+    result = {"data": fig._data, "layout": fig._layout}
+    frames = [frame._props for frame in fig._frame_objs]
+    if frames:
+        result["frames"] = frames
+    return _typed(result) if typed_arrays else result
+
+
+def _default(value, typed_arrays):
+    if isinstance(value, BaseFigure):
+        return figure_dict(value, typed_arrays)
+    if hasattr(value, "to_plotly_json"):  # Dash components
+        return value.to_plotly_json()
+    if isinstance(value, np.ndarray):  # arrays orjson can't encode (strings, objects)
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Series, pd.Index)):
+        return value.to_numpy()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, engine=None, typed_arrays=None):
+    engine = engine or JSON_ENGINE
+    if engine == "plotly" or orjson is None:
+        return to_json_plotly(value)
+    typed_arrays = TYPED_ARRAYS if typed_arrays is None else typed_arrays
+    return orjson.dumps(
+        value,
+        default=lambda v: _default(v, typed_arrays),
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    ).decode("utf-8")
+
+
+def loads(payload):
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+# Use dumps() for the callback responses (Dash encodes them with
+# dash._callback.to_json)
+def install():
+    from dash import _callback
+    _callback.to_json = dumps
+
+
+# Encoding time and size of every figure of the app with each encoder
+if __name__ == "__main__":
+    import app
+
+    ds = app.datasets.get()
+    year = int(ds.years[0])
+    figures = {
+        "update_h1_graph": app.update_h1_graph.__wrapped__(year, ds.countries[:5], "both", "year", None, ds.name),
+        "update_h2_graph": app.update_h2_graph.__wrapped__(year, "BachelorRate", "year", None, ds.name),
+        "update_h3_graph": app.update_h3_graph.__wrapped__(ds.countries[0], "linear", ds.name)[0],
+        "update_efficiency_graphs": app.update_efficiency_graphs.__wrapped__(year, "all", "year", None, ds.name),
+        "update_map": app.update_map.__wrapped__("Expenditure", year, ds.name),
+        "detect_anomalies": app.detect_anomalies.__wrapped__("Expenditure", "all", ds.name),
+    }
+    encoders = {
+        "plotly": lambda v: dumps(v, "plotly"),
+        "orjson": lambda v: dumps(v, "orjson", typed_arrays=False),
+        "orjson+typed": lambda v: dumps(v, "orjson", typed_arrays=True),
+    }
+
+    print(f"{'callback':<26}" + "".join(f"{name:>22}" for name in encoders))
+    for name, figure in figures.items():
+        line = f"{name:<26}"
+        for encode in encoders.values():
+            start = time.perf_counter()
+            for _ in range(20):
+                payload = encode(figure)
+            ms = (time.perf_counter() - start) / 20 * 1000
+            line += f"{ms:>9.2f} ms {len(payload) / 1024:>6.1f} KiB"
+        print(line)
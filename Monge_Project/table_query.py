@@ -0,0 +1,116 @@
+import logging
+from math import ceil
+
+from pandas.api.types import is_numeric_dtype
+
+log = logging.getLogger(__name__)
+
+# Backend filtering / sorting / paging for dash_table.DataTable with
+# page_action, sort_action and filter_action set to "custom"
+
+OPERATORS = [["ge ", ">="],
+             ["le ", "<="],
+             ["lt ", "<"],
+             ["gt ", ">"],
+             ["ne ", "!="],
+             ["eq ", "="],
+             ["contains "],
+             ["datestartswith "]]
+
+# The filter row of the table prefixes the operators with the case of the
+# column ("{Country} scontains Germany", "{Year} s= 2019", "icontains"):
+# s = case sensitive, i = case insensitive
+CASE_PREFIXES = ("s", "i")
+
+
+# Split one part of filter_query ("{Year} >= 2018") into (column, operator,
+# value, case) where case is "s", "i" or None (no prefix). The operator is the
+# one right after "{column}", so operator words inside a quoted value
+# ("... (Q3 + 1.5×IQR)") are not taken for it
+def split_filter_part(filter_part):
+    start, end = filter_part.find("{"), filter_part.find("}")
+    if start < 0 or end < start:
+        return [None] * 4
+    name = filter_part[start + 1: end]
+    rest = filter_part[end + 1:].lstrip()
+
+    case = None
+    # ningún operador empieza por s o i: una de ellas delante es el prefijo
+    if rest[:1] in CASE_PREFIXES:
+        case, rest = rest[0], rest[1:]
+
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator):].strip()
+                v0 = value_part[0] if value_part else ""
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                    value = value_part[1: -1].replace("\\" + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value, case
+
+    return [None] * 4
+
+
+# A number typed in the filter as text ("2019", not "2019.0")
+def _as_text(value):
+    return value if isinstance(value, str) else "%g" % value
+
+
+# Text is compared case sensitively unless the operator has the "i" prefix;
+# a plain "contains" (typed by hand, without prefix) ignores the case.
+# Parts that cannot be parsed, or name a column the table does not have,
+# are logged and ignored
+def filter_frame(frame, filter_query):
+    dff = frame
+    for filter_part in (filter_query or "").split(" && "):
+        if not filter_part.strip():
+            continue
+        col_name, operator, filter_value, case = split_filter_part(filter_part)
+        if col_name not in dff.columns:
+            log.warning("Ignoring table filter %r", filter_part)
+            continue
+
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            column = dff[col_name]
+            if not is_numeric_dtype(column):
+                # columnas de texto (Explanation) se comparan como texto
+                column = column.astype(str)
+                filter_value = _as_text(filter_value)
+                if case == "i":
+                    column, filter_value = column.str.lower(), filter_value.lower()
+            elif isinstance(filter_value, str):
+                # un valor no numérico no filtra una columna numérica
+                log.warning("Ignoring table filter %r: %r is not a number", filter_part, filter_value)
+                continue
+            dff = dff.loc[getattr(column, operator)(filter_value)]
+        elif operator == "contains":
+            dff = dff.loc[dff[col_name].astype(str).str.contains(_as_text(filter_value), case=case == "s",
+                                                                 regex=False)]
+        elif operator == "datestartswith":
+            dff = dff.loc[dff[col_name].astype(str).str.startswith(_as_text(filter_value))]
+    return dff
+
+
+# Returns (rows of the requested page as records, page count)
+def query_page(frame, page_current=0, page_size=10, sort_by=None, filter_query=""):
+    dff = filter_frame(frame, filter_query)
+
+    if sort_by:
+        dff = dff.sort_values(
+            [col["column_id"] for col in sort_by],
+            ascending=[col["direction"] == "asc" for col in sort_by],
+            kind="stable"
+        )
+
+    page_current = page_current or 0
+    start = page_current * page_size
+    page_count = max(1, ceil(len(dff) / page_size))
+    return dff.iloc[start:start + page_size].to_dict("records"), page_count
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from table_query import filter_frame, query_page, split_filter_part
+
+OUTLIERS = pd.DataFrame({
+    "Country": ["Germany", "Spain", "Germany", "France"],
+    "Year": [2018, 2019, 2019, 2020],
+    "Expenditure": [150000.0, 90000.0, 120000.0, 80000.0],
+    "Explanation": ["Above normal range (Q3 + 1.5×IQR)", "Below normal range (Q1 - 1.5×IQR)",
+                    "Above normal range (Q3 + 1.5×IQR)", "Below normal range (Q1 - 1.5×IQR)"],
+})
+
+
+# Strings sent by the filter row of the DataTable (case prefix on every operator)
+def test_split_prefixed_operators():
+    assert split_filter_part("{Country} scontains Germany") == ("Country", "contains", "Germany", "s")
+    assert split_filter_part("{Year} s= 2019") == ("Year", "eq", 2019.0, "s")
+    assert split_filter_part("{Expenditure} s> 100000") == ("Expenditure", "gt", 100000.0, "s")
+    assert split_filter_part("{Country} icontains germany") == ("Country", "contains", "germany", "i")
+    assert split_filter_part("{Year} i>= 2019") == ("Year", "ge", 2019.0, "i")
+
+
+def test_split_plain_operators():
+    assert split_filter_part("{Year} >= 2018") == ("Year", "ge", 2018.0, None)
+    assert split_filter_part("{Country} contains Germany") == ("Country", "contains", "Germany", None)
+    assert split_filter_part("{Year} s< 2018")[1] == "lt"
+    assert split_filter_part("not a filter") == [None] * 4
+
+
+def test_operator_words_inside_the_value():
+    part = '{Explanation} seq "Above normal range (Q3 + 1.5×IQR)"'
+    assert split_filter_part(part) == ("Explanation", "eq", "Above normal range (Q3 + 1.5×IQR)", "s")
+    assert len(filter_frame(OUTLIERS, part)) == 2
+
+
+def test_filter_ui_strings():
+    assert filter_frame(OUTLIERS, "{Country} scontains Germany")["Year"].tolist() == [2018, 2019]
+    assert filter_frame(OUTLIERS, "{Country} scontains germany").empty
+    assert filter_frame(OUTLIERS, "{Country} icontains germany")["Year"].tolist() == [2018, 2019]
+    assert filter_frame(OUTLIERS, "{Year} s= 2019")["Country"].tolist() == ["Spain", "Germany"]
+    assert filter_frame(OUTLIERS, "{Expenditure} s> 100000")["Year"].tolist() == [2018, 2019]
+    assert filter_frame(OUTLIERS, "{Country} i= SPAIN")["Year"].tolist() == [2019]
+    assert filter_frame(OUTLIERS, "{Year} scontains 2019")["Country"].tolist() == ["Spain", "Germany"]
+    combined = filter_frame(OUTLIERS, "{Country} scontains Germany && {Year} s> 2018")
+    assert combined["Expenditure"].tolist() == [120000.0]
+
+
+def test_unparsed_filters_are_logged(caplog):
+    assert len(filter_frame(OUTLIERS, "{Country} ~ Germany")) == len(OUTLIERS)
+    assert len(filter_frame(OUTLIERS, "{Missing} s= 1")) == len(OUTLIERS)
+    assert len(filter_frame(OUTLIERS, "{Year} s> abc")) == len(OUTLIERS)
+    assert len(caplog.records) == 3
+
+
+def test_query_page():
+    rows, pages = query_page(OUTLIERS, 0, 2, [{"column_id": "Expenditure", "direction": "desc"}],
+                             "{Country} icontains an")
+    assert [row["Country"] for row in rows] == ["Germany", "Germany"]
+    assert pages == 2
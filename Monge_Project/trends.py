@@ -0,0 +1,123 @@
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Per-country, per-sex employment trends fitted for every series at once:
+# the panel is laid out as a (series x year) matrix with NaN for the missing
+# years and every fit is a handful of vectorized reductions over that matrix
+
+METHODS = ["linear", "robust"]
+HORIZON = 3       # years forecast after the last observed one
+MIN_POINTS = 3    # fewer observed years give no trend
+
+
+# (series x year) matrix of `value`, one series per (Country, Sex) pair
+def series_matrix(df_long, value="EmploymentRate"):
+    countries = df_long["Country"].astype("category")
+    sexes = df_long["Sex"].astype("category")
+    years = np.sort(df_long["Year"].unique())
+
+    n_sexes = len(sexes.cat.categories)
+    series = countries.cat.codes.to_numpy() * n_sexes + sexes.cat.codes.to_numpy()
+    columns = np.searchsorted(years, df_long["Year"].to_numpy())
+
+    matrix = np.full((len(countries.cat.categories) * n_sexes, len(years)), np.nan)
+    matrix[series, columns] = df_long[value].to_numpy(dtype=float)
+
+    index = pd.MultiIndex.from_product(
+        [countries.cat.categories, sexes.cat.categories], names=["Country", "Sex"])
+    return matrix, years, index
+
+
+# Ordinary least squares for every row of `matrix` (NaN = not observed),
+# from the closed-form sums, with x centred for numerical stability
+def linear_fit(matrix, x):
+    observed = ~np.isnan(matrix)
+    y = np.where(observed, matrix, 0.0)
+    n = observed.sum(axis=1)
+    sx = observed @ x
+    sy = y.sum(axis=1)
+    sxx = observed @ (x * x)
+    sxy = y @ x
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept
+
+
+# Theil-Sen: median of the slopes between every pair of observed years,
+# insensitive to a few outlying years
+def robust_fit(matrix, x):
+    first, second = np.triu_indices(len(x), k=1)
+    pair_slopes = (matrix[:, second] - matrix[:, first]) / (x[second] - x[first])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # series without data
+        slope = np.nanmedian(pair_slopes, axis=1)
+        intercept = np.nanmedian(matrix - slope[:, np.newaxis] * x, axis=1)
+    return slope, intercept
+
+
+class TrendFit:
+    def __init__(self, df_long, method="linear", horizon=HORIZON, value="EmploymentRate"):
+        matrix, years, index = series_matrix(df_long, value)
+        self.center = years.mean() if len(years) else 0.0
+        x = years - self.center
+        slope, intercept = (robust_fit if method == "robust" else linear_fit)(matrix, x)
+
+        observed = ~np.isnan(matrix)
+        points = observed.sum(axis=1)
+        valid = points >= MIN_POINTS
+        last = np.where(observed.any(axis=1), years[::-1][np.argmax(observed[:, ::-1], axis=1)], 0)
+        first = np.where(observed.any(axis=1), years[np.argmax(observed, axis=1)], 0)
+
+        self.method = method
+        self.horizon = horizon
+        self.table = pd.DataFrame({
+            "slope": slope, "intercept": intercept, "points": points,
+            "first_year": first, "last_year": last,
+        }, index=index)[valid]
+
+    # Fitted line over the observed years and forecast for the next `horizon`
+    # years, per sex: {sex: (years, values, forecast_years, forecast_values)}
+    def lines(self, country):
+        if country not in self.table.index.get_level_values("Country"):
+            return {}
+        result = {}
+        for sex, row in self.table.loc[country].iterrows():
+            fitted = np.arange(int(row["first_year"]), int(row["last_year"]) + 1)
+            ahead = np.arange(int(row["last_year"]), int(row["last_year"]) + self.horizon + 1)
+            result[sex] = (
+                fitted, row["intercept"] + row["slope"] * (fitted - self.center),
+                ahead, row["intercept"] + row["slope"] * (ahead - self.center),
+            )
+        return result
+
+    # Countries by yearly change of the employment rate (average of the sexes)
+    def ranking(self, k=10):
+        by_country = self.table["slope"].groupby(level="Country", observed=True).mean()
+        return by_country.nlargest(k).rename("Slope").reset_index()
+
+
+# Fits cached per dataset version and method; older versions are dropped the
+# first time a new version is requested
+class TrendEngine:
+    def __init__(self, horizon=HORIZON):
+        self.horizon = horizon
+        self._fits = {}
+        self._lock = threading.Lock()
+
+    def fit(self, df_long, version, method="linear"):
+        key = (version, method)
+        with self._lock:
+            fit = self._fits.get(key)
+        if fit is not None:
+            return fit
+
+        fit = TrendFit(df_long, method, self.horizon)
+        with self._lock:
+            self._fits = {k: v for k, v in self._fits.items() if k[0] == version}
+            self._fits[key] = fit
+        return fit
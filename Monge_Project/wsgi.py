@@ -0,0 +1,38 @@
+import gc
+import os
+import tempfile
+
+# Production entry point: gunicorn -c gunicorn.conf.py (or any WSGI server
+# pointed at wsgi:server). With preload_app the data is loaded here, once,
+# in the master process and the forked workers share it copy-on-write.
+
+# Each worker starts its own reload watcher after the fork (gunicorn.conf.py)
+os.environ.setdefault("DATA_RELOAD_AFTER_FORK", "1")
+# Identical figure requests arriving at once share one computation across
+# the workers too, through lock files in this directory
+os.environ.setdefault("SINGLE_FLIGHT_DIR", os.path.join(tempfile.gettempdir(), "dashboard-single-flight"))
+# Every worker writes its callback histograms here and /metrics adds them up
+# (gunicorn.conf.py empties it when the server starts)
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "dashboard-metrics"))
+
+import app as dashboard  # noqa: E402
+
+# No debug overhead: no dev tools UI, hot reload, props checks or dev bundles
+dashboard.app.enable_dev_tools(
+    debug=False,
+    dev_tools_ui=False,
+    dev_tools_props_check=False,
+    dev_tools_serve_dev_bundles=False,
+    dev_tools_hot_reload=False,
+    dev_tools_silence_routes_logging=True,
+    dev_tools_prune_errors=True
+)
+
+if os.environ.get("PRELOAD_WARM_UP", "1") != "0":
+    dashboard.warm_up()
+
+# Objects loaded so far are left out of the garbage collector, so its passes
+# in the workers don't write to (and copy) the shared pages
+gc.freeze()
+
+server = dashboard.app.server